@@ -17,6 +17,10 @@ class Settings(BaseSettings):
     # Server settings
     PORT: int = int(os.getenv("PORT", "8000"))
     HOST: str = os.getenv("HOST", "0.0.0.0")
+    # Create services and load tokenizer data and clients at startup instead of on the first request
+    WARM_UP_ON_STARTUP: bool = False
+    # Log level of the app's loggers; DEBUG also logs per-chunk and per-query details and a record per pipeline stage
+    LOG_LEVEL: str = "INFO"
     
     # Pinecone settings
     PINECONE_INDEX_NAME: str = os.getenv("PINECONE_INDEX")
@@ -26,6 +30,105 @@ class Settings(BaseSettings):
     PDF_PATH: str = str(DATA_DIR / "Think-And-Grow-Rich.pdf")
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 100
+    # Processes used to extract PDF text by page range (1 uses PyPDFLoader in-process)
+    PDF_PARSE_WORKERS: int = min(4, os.cpu_count() or 1)
+    PDF_PARSE_PAGES_PER_TASK: int = 16
+    
+    # Sparse encoding settings
+    # Tokens are feature-hashed into [0, SPARSE_INDEX_SPACE); changing it requires re-ingesting
+    SPARSE_INDEX_SPACE: int = 2 ** 32
+    # "matrix" (vectorized BM25 over a CSR term-document matrix) or "legacy" (per-token BM25Okapi scoring)
+    SPARSE_ENCODER: str = "matrix"
+    # "fast" (single compiled regex pass) or "nltk" (word_tokenize); both produce the same tokens
+    TOKENIZER_BACKEND: str = "fast"
+    # Tokenized queries kept in memory for repeated query strings (0 disables the cache)
+    QUERY_TOKEN_CACHE_MAX_ENTRIES: int = 4096
+    BM25_K1: float = 1.5
+    BM25_B: float = 0.75
+    # Per-namespace BM25 corpus statistics used to encode queries
+    CORPUS_STATS_DIR: str = str(DATA_DIR / "corpus_stats")
+    # Per-namespace manifests of content-addressed chunk IDs for incremental re-ingestion
+    MANIFEST_DIR: str = str(DATA_DIR / "manifests")
+    # Re-ingestion also re-upserts unchanged chunks once the average chunk length has moved by more
+    # than this fraction since they were encoded, as BM25 normalizes their weights by it
+    BM25_REENCODE_TOLERANCE: float = 0.05
+    # Per-namespace catalog entries, and how long listings are served from memory before re-reading the index
+    NAMESPACE_CATALOG_DIR: str = str(DATA_DIR / "namespace_catalog")
+    NAMESPACE_CATALOG_TTL_SECONDS: float = 60.0
+    # Re-ingestion: "in_place" upserts only changed chunks into the current namespace; "shadow"
+    # re-uploads every chunk into a new versioned namespace and flips the namespace's alias to it when done
+    NAMESPACE_REINDEX_MODE: str = "in_place"
+    NAMESPACE_ALIAS_DIR: str = str(DATA_DIR / "namespace_aliases")
+    NAMESPACE_ALIAS_RELOAD_SECONDS: float = 1.0
+    # Delay before deleting a replaced version, so queries that resolved it can finish
+    NAMESPACE_GC_DELAY_SECONDS: float = 30.0
+    
+    # Vector store backend: "pinecone" or "local" (in-process index snapshotted to LOCAL_INDEX_DIR)
+    VECTOR_STORE_BACKEND: str = "pinecone"
+    LOCAL_INDEX_DIR: str = str(DATA_DIR / "local_index")
+    
+    # Vector upsert settings
+    UPSERT_BATCH_SIZE: int = 100
+    # Pinecone rejects upsert requests over 2MB; keep headroom for request framing
+    UPSERT_MAX_BATCH_BYTES: int = 1_500_000
+    UPSERT_MAX_IN_FLIGHT: int = 4
+    # Upsert requests in flight across all concurrent uploads of the process
+    UPSERT_MAX_IN_FLIGHT_TOTAL: int = 8
+    
+    # URL download settings
+    DOWNLOAD_CACHE_DIR: str = str(DATA_DIR / "download_cache")
+    DOWNLOAD_CACHE_MAX_BYTES: int = 2 * 1024 ** 3
+    DOWNLOAD_MAX_BYTES: int = 200 * 1024 ** 2
+    DOWNLOAD_CHUNK_BYTES: int = 1024 ** 2
+    DOWNLOAD_CONNECT_TIMEOUT: float = 10.0
+    DOWNLOAD_READ_TIMEOUT: float = 60.0
+    DOWNLOAD_POOL_SIZE: int = 10
+    # Downloads in progress across all ingestion jobs of the process
+    DOWNLOAD_MAX_CONCURRENT: int = 4
+    
+    # Multipart upload settings; uploads are removed once ingested
+    UPLOAD_DIR: str = str(DATA_DIR / "uploads")
+    UPLOAD_MAX_BYTES: int = 200 * 1024 ** 2
+    
+    # Ingestion job settings
+    INGESTION_WORKERS: int = 2
+    # Jobs accepted but not yet picked up by a worker; a batch is accepted only if all of it fits
+    INGESTION_QUEUE_SIZE: int = 1000
+    INGESTION_JOB_HISTORY: int = 500
+    # Stream pages through chunking, encoding and upload instead of loading the whole PDF first
+    INGESTION_STREAMING: bool = False
+    INGESTION_WINDOW_CHUNKS: int = 256
+    # Batch ingestion: documents per request, and the directory server-side paths must be in
+    INGESTION_BATCH_MAX_DOCUMENTS: int = 500
+    INGESTION_LOCAL_ROOT: str = str(DATA_DIR)
+    
+    # Retrieval cache settings (0 entries disables the cache)
+    RETRIEVAL_CACHE_MAX_ENTRIES: int = 1024
+    RETRIEVAL_CACHE_TTL_SECONDS: float = 300.0
+    
+    # LLM answer cache settings: "memory", "disk" (SQLite shared by all workers) or "none"
+    ANSWER_CACHE_BACKEND: str = "memory"
+    ANSWER_CACHE_MAX_BYTES: int = 64 * 1024 ** 2
+    ANSWER_CACHE_PATH: str = str(DATA_DIR / "answer_cache.sqlite3")
+    
+    # Batch query settings: concurrent vector store queries and LLM calls per batch
+    QUERY_MAX_CONCURRENCY: int = 16
+    LLM_MAX_CONCURRENCY: int = 8
+    # Threads for async queries when the index has no asyncio client (caps in-flight queries per worker)
+    VECTOR_STORE_ASYNC_THREADS: int = 64
+    
+    # Two-stage retrieval: over-fetch candidates from the vector store, then rerank them
+    # with the namespace's cached BM25 model (term frequencies cached per chunk)
+    RERANK_ENABLED: bool = False
+    RERANK_OVERFETCH: int = 3
+    # Pinecone returns at most 1000 matches with metadata
+    RERANK_MAX_CANDIDATES: int = 1000
+    RERANK_CACHE_MAX_CHUNKS: int = 20000
+    
+    # Context packing settings: overlapping and adjacent chunks of a page are merged and
+    # packed into the prompt in score order up to the token budget
+    CONTEXT_PACKING_ENABLED: bool = True
+    CONTEXT_TOKEN_BUDGET: int = 6000
     
     # Model settings
     EMBEDDING_MODEL: str = "text-embedding-3-small"
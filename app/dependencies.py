@@ -0,0 +1,77 @@
+from typing import Optional
+import logging
+import threading
+from config.settings import Settings
+from services.document_service import DocumentService
+from services.ingestion_job_service import IngestionJobService
+from services.llm_service import LLMService
+
+logger = logging.getLogger(__name__)
+
+class ServiceContainer:
+    """
+    Process-wide services, created on first use and shared by every router,
+    so a worker builds one DocumentService, one index client and one LLM client
+    """
+
+    def __init__(self):
+        self._settings: Optional[Settings] = None
+        self._document_service: Optional[DocumentService] = None
+        self._llm_service: Optional[LLMService] = None
+        self._ingestion_job_service: Optional[IngestionJobService] = None
+        self._lock = threading.RLock()
+
+    @property
+    def settings(self) -> Settings:
+        with self._lock:
+            if self._settings is None:
+                self._settings = Settings()
+            return self._settings
+
+    @property
+    def document_service(self) -> DocumentService:
+        with self._lock:
+            if self._document_service is None:
+                self._document_service = DocumentService(self.settings)
+            return self._document_service
+
+    @property
+    def llm_service(self) -> LLMService:
+        with self._lock:
+            if self._llm_service is None:
+                self._llm_service = LLMService(self.settings)
+            return self._llm_service
+
+    @property
+    def ingestion_job_service(self) -> IngestionJobService:
+        with self._lock:
+            if self._ingestion_job_service is None:
+                self._ingestion_job_service = IngestionJobService(self.settings)
+            return self._ingestion_job_service
+
+    def warm_up(self) -> None:
+        """Create the services and load tokenizer data and clients ahead of the first request"""
+        logger.info("Warming up services...")
+        document_service = self.document_service
+        document_service.embedding_service.warm_up()
+        document_service.vector_store_service.warm_up()
+        self.llm_service.warm_up()
+
+    async def aclose(self) -> None:
+        """Close the async clients of the services created so far"""
+        if self._document_service is not None:
+            await self._document_service.vector_store_service.aclose()
+
+container = ServiceContainer()
+
+def get_settings() -> Settings:
+    return container.settings
+
+def get_document_service() -> DocumentService:
+    return container.document_service
+
+def get_llm_service() -> LLMService:
+    return container.llm_service
+
+def get_ingestion_job_service() -> IngestionJobService:
+    return container.ingestion_job_service
@@ -1,13 +1,35 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import logging
 import uvicorn
-from routers import document_router, query_router
+from fastapi.concurrency import run_in_threadpool
+from routers import document_router, metrics_router, query_router
 from config.settings import get_settings
+from dependencies import container
+
+def configure_logging(level: str) -> None:
+    """Log the app's modules at the configured level; other libraries keep the default WARNING"""
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    for name in ("services", "routers", "dependencies"):
+        logging.getLogger(name).setLevel(level.upper())
+
+configure_logging(container.settings.LOG_LEVEL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Services are created on first use; warming up moves that work before the first request
+    if container.settings.WARM_UP_ON_STARTUP:
+        await run_in_threadpool(container.warm_up)
+    yield
+    # Close async vector store clients opened by the query path
+    await container.aclose()
 
 app = FastAPI(
     title="PDF Q&A API",
     description="API for querying PDF documents using LangChain and Pinecone",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -22,6 +44,7 @@ app.add_middleware(
 # Include routers
 app.include_router(document_router.router)
 app.include_router(query_router.router)
+app.include_router(metrics_router.router)
 
 @app.get("/health")
 async def health_check():
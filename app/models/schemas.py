@@ -1,6 +1,16 @@
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+import re
+
+# Suffix of the versioned namespaces created when a namespace is reindexed.
+# Deleting a namespace is still allowed, for ones created before it was reserved.
+_RESERVED_NAMESPACE_SUFFIX = re.compile(r"__v\d+$")
+
+def _check_namespace_suffix(namespace: str) -> str:
+    if _RESERVED_NAMESPACE_SUFFIX.search(namespace):
+        raise ValueError('Namespace cannot end with "__v" followed by digits, which is reserved for reindexed versions')
+    return namespace
 
 class Source(BaseModel):
     page: int = Field(..., description="Page number in the document")
@@ -27,13 +37,34 @@ class QueryRequest(BaseModel):
     def validate_namespace(cls, v):
         if not v.strip():
             raise ValueError('Namespace cannot be empty or just whitespace')
-        return v.strip().lower().replace(' ', '_')
+        return _check_namespace_suffix(v.strip().lower().replace(' ', '_'))
 
 class QueryResponse(BaseModel):
     answer: str = Field(..., description="AI-generated answer to the query")
     sources: List[Source] = Field(..., description="List of sources used to generate the answer")
+    context_tokens: Optional[int] = Field(None, description="Tokens of retrieved context sent to the LLM")
+    context_tokens_saved: Optional[int] = Field(None, description="Context tokens saved by merging overlapping chunks and the token budget")
     # timestamp: datetime = Field(default_factory=datetime.utcnow, description="Timestamp of the response")
 
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=500,
+        description="Questions to answer, each with its own namespace and k"
+    )
+
+class BatchQueryResult(BaseModel):
+    index: int = Field(..., description="Position of the question in the request")
+    answer: Optional[str] = Field(None, description="AI-generated answer, if the question succeeded")
+    sources: Optional[List[Source]] = Field(None, description="Sources used to generate the answer")
+    context_tokens: Optional[int] = Field(None, description="Tokens of retrieved context sent to the LLM")
+    context_tokens_saved: Optional[int] = Field(None, description="Context tokens saved by merging overlapping chunks and the token budget")
+    error: Optional[str] = Field(None, description="Error message, if the question failed")
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryResult] = Field(..., description="One result per question, in request order")
+
 class DocumentResponse(BaseModel):
     message: str = Field(..., description="Response message")
     timestamp: datetime = Field(default_factory=datetime.utcnow, description="Timestamp of the response")
@@ -62,13 +93,13 @@ class URLDocumentRequest(BaseModel):
         if not v.strip():
             raise ValueError('Title cannot be empty or just whitespace')
         # Remove any special characters and spaces for namespace
-        return v.strip().lower().replace(' ', '_')
+        return _check_namespace_suffix(v.strip().lower().replace(' ', '_'))
     
     @validator('namespace')
     def validate_namespace(cls, v):
         if not v.strip():
             raise ValueError('Namespace cannot be empty or just whitespace')
-        return v.strip().lower().replace(' ', '_')
+        return _check_namespace_suffix(v.strip().lower().replace(' ', '_'))
 
 class DeleteDocumentRequest(BaseModel):
     namespace: str = Field(..., description="Required namespace to delete documents from")
@@ -86,9 +117,94 @@ class UploadDocumentRequest(BaseModel):
     def validate_namespace(cls, v):
         if not v.strip():
             raise ValueError('Namespace cannot be empty or just whitespace')
-        return v.strip().lower().replace(' ', '_')
+        return _check_namespace_suffix(v.strip().lower().replace(' ', '_'))
+
+class NamespaceInfo(BaseModel):
+    namespace: str = Field(..., description="Name of the namespace")
+    vector_count: int = Field(..., description="Number of vectors in the namespace")
+    chunk_count: Optional[int] = Field(None, description="Number of chunks of the ingested document")
+    source: Optional[str] = Field(None, description="Path, URL or file name of the ingested document")
+    ingested_at: Optional[datetime] = Field(None, description="Time the document was last ingested")
+    ingest_seconds: Optional[float] = Field(None, description="Seconds the last ingestion took")
 
 class NamespaceListResponse(BaseModel):
     namespaces: List[str] = Field(..., description="List of namespaces in the index")
+    entries: List[NamespaceInfo] = Field(default_factory=list, description="Catalog entry of each namespace")
     total: int = Field(..., description="Total number of namespaces")
-    timestamp: datetime = Field(default_factory=datetime.utcnow, description="Timestamp of the response") 
\ No newline at end of file
+    timestamp: datetime = Field(default_factory=datetime.utcnow, description="Timestamp of the response") 
+
+class BatchIngestionItem(BaseModel):
+    url: Optional[str] = Field(None, description="URL of the PDF document to process")
+    path: Optional[str] = Field(None, description="Server-side path of the PDF document, relative to the ingestion root")
+    namespace: str = Field(..., description="Namespace to upload the document to")
+
+    @validator('url')
+    def validate_url(cls, v):
+        if v is None:
+            return v
+        if not v.strip():
+            raise ValueError('URL cannot be empty or just whitespace')
+        if not v.lower().strip().endswith('.pdf'):
+            raise ValueError('URL must point to a PDF file')
+        return v.strip()
+
+    @validator('path', always=True)
+    def validate_path(cls, v, values):
+        if v is not None and not v.strip():
+            raise ValueError('Path cannot be empty or just whitespace')
+        if (v is None) == (values.get('url') is None):
+            raise ValueError('Exactly one of url or path is required')
+        return v.strip() if v is not None else v
+
+    @validator('namespace')
+    def validate_namespace(cls, v):
+        if not v.strip():
+            raise ValueError('Namespace cannot be empty or just whitespace')
+        return _check_namespace_suffix(v.strip().lower().replace(' ', '_'))
+
+class BatchIngestionRequest(BaseModel):
+    documents: List[BatchIngestionItem] = Field(
+        ...,
+        min_length=1,
+        max_length=500,
+        description="Documents to ingest, each from a URL or a server-side path into its own namespace"
+    )
+
+    @validator('documents')
+    def validate_documents(cls, v):
+        # A namespace holds one document, so two documents would overwrite each other
+        seen = set()
+        duplicates = sorted({d.namespace for d in v if d.namespace in seen or seen.add(d.namespace)})
+        if duplicates:
+            raise ValueError(f"Each document needs its own namespace, duplicated: {', '.join(duplicates)}")
+        return v
+
+class IngestionJobResponse(BaseModel):
+    job_id: str = Field(..., description="ID of the ingestion job")
+    batch_id: Optional[str] = Field(None, description="ID of the batch the job was submitted in")
+    namespace: str = Field(..., description="Namespace the document is ingested into")
+    source: Optional[str] = Field(None, description="Path or URL of the ingested document")
+    status: str = Field(..., description="Job status: queued, running, succeeded, failed or cancelled")
+    stage: str = Field(..., description="Current stage: queued, download, parse, chunk, encode, upsert or done")
+    chunks_total: int = Field(0, description="Number of chunks produced so far")
+    chunks_encoded: int = Field(0, description="Number of chunks encoded so far")
+    vectors_upserted: int = Field(0, description="Number of vectors upserted so far")
+    elapsed_seconds: Optional[float] = Field(None, description="Seconds since the job started running")
+    vectors_per_second: Optional[float] = Field(None, description="Upsert throughput of the job")
+    error: Optional[str] = Field(None, description="Error message if the job failed")
+    created_at: datetime = Field(..., description="Time the job was queued")
+    started_at: Optional[datetime] = Field(None, description="Time the job started running")
+    finished_at: Optional[datetime] = Field(None, description="Time the job finished")
+
+class CacheStatsResponse(BaseModel):
+    hits: int = Field(..., description="Number of cache hits")
+    misses: int = Field(..., description="Number of cache misses")
+    hit_ratio: float = Field(..., description="Fraction of lookups served from the cache")
+    size: int = Field(..., description="Number of cached entries")
+    max_entries: int = Field(..., description="Maximum number of cached entries")
+    ttl_seconds: float = Field(..., description="Time to live of a cached entry in seconds")
+
+class BatchIngestionResponse(BaseModel):
+    batch_id: str = Field(..., description="ID of the ingestion batch")
+    status_counts: Dict[str, int] = Field(..., description="Number of jobs per status")
+    jobs: List[IngestionJobResponse] = Field(..., description="One job per document, in request order")
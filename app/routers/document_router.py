@@ -1,9 +1,23 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 from services.document_service import DocumentService
+from services.ingestion_job_service import IngestionJobService, IngestionQueueFullError, JobSpec
+from services.upload_service import UploadTooLargeError
 from config.settings import Settings
-from models.schemas import DocumentResponse, ErrorResponse, URLDocumentRequest, UploadDocumentRequest, NamespaceListResponse
-from typing import Union
+from dependencies import get_document_service, get_ingestion_job_service, get_settings
+from models.schemas import (
+    DocumentResponse, ErrorResponse, URLDocumentRequest, UploadDocumentRequest, NamespaceListResponse,
+    IngestionJobResponse, BatchIngestionRequest, BatchIngestionResponse, NamespaceInfo
+)
+from collections import Counter
+from functools import partial
+from typing import List, Union
 import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/api/v1/documents",
@@ -15,41 +29,50 @@ router = APIRouter(
     },
 )
 
-# Initialize services
-settings = Settings()
-document_service = DocumentService(settings)
-
 @router.post(
     "/upload",
-    response_model=DocumentResponse,
-    status_code=status.HTTP_201_CREATED,
+    response_model=IngestionJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
     responses={
-        201: {"description": "Document successfully processed and uploaded"},
+        202: {"description": "Document queued for processing"},
         400: {"description": "Invalid request"},
+        503: {"description": "Ingestion queue is full"},
         500: {"description": "Internal server error"}
     }
 )
-async def upload_document(request: UploadDocumentRequest) -> Union[DocumentResponse, ErrorResponse]:
+async def upload_document(
+    request: UploadDocumentRequest,
+    settings: Settings = Depends(get_settings),
+    document_service: DocumentService = Depends(get_document_service),
+    ingestion_job_service: IngestionJobService = Depends(get_ingestion_job_service)
+) -> Union[IngestionJobResponse, ErrorResponse]:
     """
-    Upload and process a PDF document.
+    Queue a PDF document for processing and upload.
     
     The document should be placed in the configured path before calling this endpoint.
+    Poll GET /api/v1/documents/jobs/{job_id} for progress.
     
     Request body must include:
     - namespace: Namespace to upload the document to
     """
-    try:
-        print(f"document_router: Uploading document to namespace: {request.namespace}")
-        document_service.process_and_upload_document(request.namespace)
-        return DocumentResponse(
-            message=f"Document processed and uploaded successfully to namespace: {request.namespace}",
-            document_id=request.namespace
-        )
-    except FileNotFoundError:
+    if not os.path.exists(settings.PDF_PATH):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="PDF file not found in the configured path"
         )
+    try:
+        logger.info("Queueing document upload to namespace: %s", request.namespace)
+        job = ingestion_job_service.submit(
+            request.namespace,
+            settings.PDF_PATH,
+            lambda progress: document_service.process_and_upload_document(request.namespace, progress=progress)
+        )
+        return IngestionJobResponse(**job.to_dict())
+    except IngestionQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -58,26 +81,224 @@ async def upload_document(request: UploadDocumentRequest) -> Union[DocumentRespo
 
 @router.post(
     "/upload-url",
-    response_model=DocumentResponse,
-    status_code=status.HTTP_201_CREATED,
+    response_model=IngestionJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
     responses={
-        201: {"description": "Document successfully processed and uploaded"},
+        202: {"description": "Document queued for processing"},
         400: {"description": "Invalid request"},
+        503: {"description": "Ingestion queue is full"},
         500: {"description": "Internal server error"}
     }
 )
-async def upload_url_document(request: URLDocumentRequest) -> Union[DocumentResponse, ErrorResponse]:
+async def upload_url_document(
+    request: URLDocumentRequest,
+    document_service: DocumentService = Depends(get_document_service),
+    ingestion_job_service: IngestionJobService = Depends(get_ingestion_job_service)
+) -> Union[IngestionJobResponse, ErrorResponse]:
     """
-    Upload and process a PDF document from a URL.
+    Queue a PDF document from a URL for processing and upload.
     
     The document will be processed and stored in a namespace based on the provided title.
+    Poll GET /api/v1/documents/jobs/{job_id} for progress.
     """
     try:
-        print("document_router: Uploading document from URL...")
-        document_service.process_and_upload_url_document(request.url, request.title)
-        return DocumentResponse(
-            message=f"Document processed and uploaded successfully to namespace: {request.title}",
-            document_id=request.title
+        logger.info("Queueing document upload from URL...")
+        job = ingestion_job_service.submit(
+            request.title,
+            request.url,
+            lambda progress: document_service.process_and_upload_url_document(request.url, request.title, progress=progress)
+        )
+        return IngestionJobResponse(**job.to_dict())
+    except IngestionQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+def _process_file(document_service: DocumentService, file_path: str, namespace: str, job) -> None:
+    document_service.process_and_upload_file(file_path, namespace, progress=job, source=job.source)
+
+def _download(document_service: DocumentService, url: str, downloads: List[str], job) -> str:
+    file_path = document_service.download_document(url, progress=job)
+    downloads.append(file_path)
+    return file_path
+
+def _release_downloads(document_service: DocumentService, downloads: List[str]) -> None:
+    for file_path in downloads:
+        document_service.release_download(file_path)
+
+def _process_prepared_file(document_service: DocumentService, namespace: str, job) -> None:
+    # job.prepared is the path the download step returned
+    document_service.process_and_upload_file(job.prepared, namespace, progress=job, source=job.source)
+
+def _batch_response(batch_id: str, jobs: List) -> BatchIngestionResponse:
+    return BatchIngestionResponse(
+        batch_id=batch_id,
+        status_counts=dict(Counter(job.status for job in jobs)),
+        jobs=[IngestionJobResponse(**job.to_dict()) for job in jobs]
+    )
+
+@router.post(
+    "/upload-file",
+    response_model=IngestionJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        202: {"description": "Document received and queued for processing"},
+        400: {"description": "Invalid request"},
+        413: {"description": "Document is too large"},
+        503: {"description": "Ingestion queue is full"},
+        500: {"description": "Internal server error"}
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": ["file", "namespace"],
+                        "properties": {
+                            "file": {"type": "string", "format": "binary", "description": "PDF document"},
+                            "namespace": {"type": "string", "description": "Namespace to upload the document to"}
+                        }
+                    }
+                }
+            }
+        }
+    }
+)
+async def upload_file(
+    request: Request,
+    document_service: DocumentService = Depends(get_document_service),
+    ingestion_job_service: IngestionJobService = Depends(get_ingestion_job_service)
+) -> Union[IngestionJobResponse, ErrorResponse]:
+    """
+    Upload a PDF document as multipart/form-data and queue it for processing.
+    
+    The file is streamed to a temporary file on the server while it is received,
+    up to the configured size limit, and removed once it has been ingested.
+    Poll GET /api/v1/documents/jobs/{job_id} for progress.
+    
+    Form fields:
+    - file: The PDF document
+    - namespace: Namespace to upload the document to
+    """
+    upload_service = document_service.upload_service
+    try:
+        upload = await upload_service.receive(
+            request.headers.get("content-type", ""),
+            request.headers.get("content-length"),
+            request.stream()
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    try:
+        form = UploadDocumentRequest(namespace=upload.fields.get("namespace", ""))
+    except ValidationError as e:
+        upload_service.remove(upload.path)
+        raise RequestValidationError(e.errors())
+
+    try:
+        logger.info("Queueing uploaded file %s to namespace: %s", upload.filename, form.namespace)
+        job = ingestion_job_service.submit(
+            form.namespace,
+            upload.filename,
+            partial(_process_file, document_service, upload.path, form.namespace),
+            cleanup=partial(upload_service.remove, upload.path)
+        )
+        return IngestionJobResponse(**job.to_dict())
+    except IngestionQueueFullError as e:
+        upload_service.remove(upload.path)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except Exception as e:
+        upload_service.remove(upload.path)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.post(
+    "/upload-batch",
+    response_model=BatchIngestionResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        202: {"description": "Documents queued for processing"},
+        400: {"description": "Invalid request"},
+        503: {"description": "Ingestion queue cannot take the batch"},
+        500: {"description": "Internal server error"}
+    }
+)
+async def upload_batch(
+    request: BatchIngestionRequest,
+    settings: Settings = Depends(get_settings),
+    document_service: DocumentService = Depends(get_document_service),
+    ingestion_job_service: IngestionJobService = Depends(get_ingestion_job_service)
+) -> Union[BatchIngestionResponse, ErrorResponse]:
+    """
+    Queue a batch of PDF documents for processing and upload, one job per document.
+    
+    Each document comes from a URL or a server-side path below the configured
+    ingestion root, and goes into its own namespace. Downloads run concurrently
+    while earlier documents are parsed, encoded and upserted. The batch is queued
+    all or none. Poll GET /api/v1/documents/batches/{batch_id} for progress.
+    """
+    if len(request.documents) > settings.INGESTION_BATCH_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch can have at most {settings.INGESTION_BATCH_MAX_DOCUMENTS} documents"
+        )
+
+    specs = []
+    for document in request.documents:
+        if document.path is not None:
+            try:
+                file_path = document_service.resolve_local_path(document.path)
+            except (ValueError, FileNotFoundError) as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
+            specs.append(JobSpec(
+                document.namespace,
+                file_path,
+                partial(_process_file, document_service, file_path, document.namespace)
+            ))
+        else:
+            # The job's link to the downloaded file is removed once the job has finished
+            downloads: List[str] = []
+            specs.append(JobSpec(
+                document.namespace,
+                document.url,
+                partial(_process_prepared_file, document_service, document.namespace),
+                prepare=partial(_download, document_service, document.url, downloads),
+                cleanup=partial(_release_downloads, document_service, downloads)
+            ))
+
+    try:
+        logger.info("Queueing batch upload of %d documents", len(specs))
+        jobs = ingestion_job_service.submit_batch(specs)
+        return _batch_response(jobs[0].batch_id, jobs)
+    except IngestionQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
         )
     except Exception as e:
         raise HTTPException(
@@ -85,6 +306,80 @@ async def upload_url_document(request: URLDocumentRequest) -> Union[DocumentResp
             detail=str(e)
         )
 
+@router.get(
+    "/batches/{batch_id}",
+    response_model=BatchIngestionResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Successfully retrieved batch status"},
+        404: {"description": "Batch not found"}
+    }
+)
+async def get_ingestion_batch(
+    batch_id: str,
+    ingestion_job_service: IngestionJobService = Depends(get_ingestion_job_service)
+) -> Union[BatchIngestionResponse, ErrorResponse]:
+    """
+    Get the status counts and the jobs of an ingestion batch.
+    """
+    jobs = ingestion_job_service.get_batch(batch_id)
+    if not jobs:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Ingestion batch '{batch_id}' not found"
+        )
+    return _batch_response(batch_id, jobs)
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=IngestionJobResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Successfully retrieved job status"},
+        404: {"description": "Job not found"}
+    }
+)
+async def get_ingestion_job(
+    job_id: str,
+    ingestion_job_service: IngestionJobService = Depends(get_ingestion_job_service)
+) -> Union[IngestionJobResponse, ErrorResponse]:
+    """
+    Get the status, stage and progress of an ingestion job.
+    """
+    job = ingestion_job_service.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Ingestion job '{job_id}' not found"
+        )
+    return IngestionJobResponse(**job.to_dict())
+
+@router.delete(
+    "/jobs/{job_id}",
+    response_model=IngestionJobResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Job cancelled or already finished"},
+        404: {"description": "Job not found"}
+    }
+)
+async def cancel_ingestion_job(
+    job_id: str,
+    ingestion_job_service: IngestionJobService = Depends(get_ingestion_job_service)
+) -> Union[IngestionJobResponse, ErrorResponse]:
+    """
+    Cancel an ingestion job. A running job stops at its next stage or batch boundary,
+    so vectors upserted before that remain in the namespace.
+    """
+    logger.info("Cancelling ingestion job: %s", job_id)
+    job = ingestion_job_service.cancel(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Ingestion job '{job_id}' not found"
+        )
+    return IngestionJobResponse(**job.to_dict())
+
 @router.delete(
     "",
     response_model=DocumentResponse,
@@ -95,7 +390,10 @@ async def upload_url_document(request: URLDocumentRequest) -> Union[DocumentResp
         500: {"description": "Internal server error"}
     }
 )
-async def delete_document(namespace: str) -> Union[DocumentResponse, ErrorResponse]:
+async def delete_document(
+    namespace: str,
+    document_service: DocumentService = Depends(get_document_service)
+) -> Union[DocumentResponse, ErrorResponse]:
     """
     Delete all documents from the specified namespace in the vector store.
     
@@ -103,7 +401,7 @@ async def delete_document(namespace: str) -> Union[DocumentResponse, ErrorRespon
         namespace: The namespace to delete documents from
     """
     try:
-        print(f"document_router: Deleting documents from namespace: {namespace}")
+        logger.info("Deleting documents from namespace: %s", namespace)
         document_service.delete_document(namespace)
         return DocumentResponse(
             message=f"Documents in namespace '{namespace}' deleted successfully"
@@ -137,19 +435,25 @@ async def delete_document(namespace: str) -> Union[DocumentResponse, ErrorRespon
         500: {"description": "Internal server error"}
     }
 )
-async def list_namespaces() -> Union[NamespaceListResponse, ErrorResponse]:
+async def list_namespaces(
+    document_service: DocumentService = Depends(get_document_service)
+) -> Union[NamespaceListResponse, ErrorResponse]:
     """
     List all namespaces in the vector store index.
     
+    Served from the namespace catalog, which is refreshed from the index at most
+    once per configured TTL and updated immediately by uploads and deletes.
+    
     Returns:
-        List of namespaces and total count
+        List of namespaces, their catalog entries and total count
     """
     try:
-        print("document_router: Listing all namespaces")
-        namespaces = document_service.list_namespaces()
+        logger.debug("Listing all namespaces")
+        entries = document_service.list_namespace_entries()
         return NamespaceListResponse(
-            namespaces=namespaces,
-            total=len(namespaces)
+            namespaces=[entry["namespace"] for entry in entries],
+            entries=[NamespaceInfo(**entry) for entry in entries],
+            total=len(entries)
         )
     except Exception as e:
         error_str = str(e)
@@ -169,4 +473,36 @@ async def list_namespaces() -> Union[NamespaceListResponse, ErrorResponse]:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_detail
-        ) 
\ No newline at end of file
+        )
+
+@router.get(
+    "/namespaces/{namespace}",
+    response_model=NamespaceInfo,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Successfully retrieved namespace"},
+        404: {"description": "Namespace not found"},
+        500: {"description": "Internal server error"}
+    }
+)
+async def get_namespace(
+    namespace: str,
+    document_service: DocumentService = Depends(get_document_service)
+) -> Union[NamespaceInfo, ErrorResponse]:
+    """
+    Get the vector count, chunk count, source document, ingest time and ingest
+    duration of a namespace.
+    """
+    try:
+        entry = document_service.get_namespace(namespace)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+    if entry is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Namespace '{namespace}' not found"
+        )
+    return NamespaceInfo(**entry)
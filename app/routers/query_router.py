@@ -1,9 +1,15 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from services.document_service import DocumentService
 from services.llm_service import LLMService
-from config.settings import Settings
-from models.schemas import QueryRequest, QueryResponse, ErrorResponse
-from typing import Union
+from dependencies import get_document_service, get_llm_service
+from models.schemas import (
+    QueryRequest, QueryResponse, ErrorResponse, CacheStatsResponse,
+    BatchQueryRequest, BatchQueryResponse, BatchQueryResult
+)
+from typing import Any, AsyncIterator, Dict, List, Union
+import json
 
 router = APIRouter(
     prefix="/api/v1/query",
@@ -15,11 +21,6 @@ router = APIRouter(
     },
 )
 
-# Initialize services
-settings = Settings()
-document_service = DocumentService(settings)
-llm_service = LLMService(settings)
-
 @router.post(
     "",
     response_model=QueryResponse,
@@ -30,7 +31,11 @@ llm_service = LLMService(settings)
         500: {"description": "Internal server error"}
     }
 )
-async def query_document(request: QueryRequest) -> Union[QueryResponse, ErrorResponse]:
+async def query_document(
+    request: QueryRequest,
+    document_service: DocumentService = Depends(get_document_service),
+    llm_service: LLMService = Depends(get_llm_service)
+) -> Union[QueryResponse, ErrorResponse]:
     """
     Query the document with a question.
     
@@ -40,7 +45,7 @@ async def query_document(request: QueryRequest) -> Union[QueryResponse, ErrorRes
     """
     try:
         # Get relevant chunks from vector store
-        results = document_service.similarity_search(
+        results = await document_service.asimilarity_search(
             request.query, 
             k=request.k,
             namespace=request.namespace
@@ -53,7 +58,7 @@ async def query_document(request: QueryRequest) -> Union[QueryResponse, ErrorRes
             )
         
         # Get structured answer with sources
-        response = llm_service.get_structured_answer(request.query, results)
+        response = await llm_service.aget_structured_answer(request.query, results)
         
         return QueryResponse(**response)
     except HTTPException as he:
@@ -62,4 +67,160 @@ async def query_document(request: QueryRequest) -> Union[QueryResponse, ErrorRes
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
-        ) 
\ No newline at end of file
+        ) 
+
+@router.post(
+    "/batch",
+    response_model=BatchQueryResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Per-question answers or errors"},
+        400: {"description": "Invalid request"},
+        500: {"description": "Internal server error"}
+    }
+)
+async def batch_query_document(
+    request: BatchQueryRequest,
+    document_service: DocumentService = Depends(get_document_service),
+    llm_service: LLMService = Depends(get_llm_service)
+) -> BatchQueryResponse:
+    """
+    Answer several questions in one request.
+
+    - **queries**: Up to 500 questions, each with **query**, **k** and **namespace** as in a single query
+
+    Queries are encoded together, retrieval and LLM calls run concurrently, and
+    each question gets its own result or error in request order.
+    """
+    items = request.queries
+    try:
+        retrieved = await run_in_threadpool(
+            document_service.similarity_search_batch,
+            [item.query for item in items],
+            [item.namespace for item in items],
+            [item.k for item in items]
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+    results: List[BatchQueryResult] = [None] * len(items)
+    answerable = []
+    for i, documents in enumerate(retrieved):
+        if isinstance(documents, Exception):
+            results[i] = BatchQueryResult(index=i, error=str(documents))
+        elif not documents:
+            results[i] = BatchQueryResult(index=i, error="No relevant content found for the query")
+        else:
+            answerable.append(i)
+
+    if answerable:
+        try:
+            answers = await run_in_threadpool(
+                llm_service.get_structured_answers,
+                [items[i].query for i in answerable],
+                [retrieved[i] for i in answerable]
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=str(e)
+            )
+        for i, answer in zip(answerable, answers):
+            if isinstance(answer, Exception):
+                results[i] = BatchQueryResult(index=i, error=str(answer))
+            else:
+                results[i] = BatchQueryResult(index=i, **answer)
+
+    return BatchQueryResponse(results=results)
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post(
+    "/stream",
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "Answer streamed as server-sent events",
+            "content": {"text/event-stream": {}}
+        },
+        400: {"description": "Invalid request"},
+        500: {"description": "Internal server error"}
+    }
+)
+async def stream_query_document(
+    request: QueryRequest,
+    document_service: DocumentService = Depends(get_document_service),
+    llm_service: LLMService = Depends(get_llm_service)
+) -> StreamingResponse:
+    """
+    Query the document with a question and stream the answer as server-sent events.
+
+    Events are sent in this order:
+    - **sources**: `{"sources": [...], "context_tokens": ..., "context_tokens_saved": ...}` as soon as retrieval finishes
+    - **token**: `{"text": "..."}` for each chunk of the answer
+    - **done**: `{}` once the answer is complete, or **error**: `{"detail": "..."}` if generation fails
+    """
+    try:
+        results = await document_service.asimilarity_search(
+            request.query,
+            k=request.k,
+            namespace=request.namespace
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+    if not results:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No relevant content found for the query"
+        )
+
+    packed = await run_in_threadpool(llm_service.pack_context, results)
+
+    async def event_stream() -> AsyncIterator[str]:
+        yield _sse_event("sources", {
+            "sources": llm_service.get_sources(packed.documents),
+            "context_tokens": packed.tokens,
+            "context_tokens_saved": packed.tokens_saved
+        })
+        try:
+            async for token in llm_service.stream_answer(request.query, packed):
+                yield _sse_event("token", {"text": token})
+        except Exception as e:
+            # Headers are already sent, so report the failure in the stream
+            yield _sse_event("error", {"detail": str(e)})
+            return
+        yield _sse_event("done", {})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@router.get(
+    "/cache",
+    response_model=CacheStatsResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Successfully retrieved retrieval cache statistics"}
+    }
+)
+async def retrieval_cache_stats(
+    document_service: DocumentService = Depends(get_document_service)
+) -> CacheStatsResponse:
+    """
+    Get hit/miss counters of the retrieval cache of this worker.
+    """
+    return CacheStatsResponse(**document_service.retrieval_cache.stats())
\ No newline at end of file
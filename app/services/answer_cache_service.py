@@ -0,0 +1,162 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from pathlib import Path
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from config.settings import Settings
+from .metrics_service import record_cache_lookup
+
+class MemoryAnswerCache:
+    """In-process LRU answer cache bounded by the total size of cached answers"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, answer: str) -> None:
+        size = len(answer.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[0]
+            self._entries[key] = (size, answer)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, (evicted_size, _) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+class DiskAnswerCache:
+    """
+    SQLite-backed answer cache shared by every worker on the host, evicting the
+    least recently used answers beyond a total size
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "key TEXT PRIMARY KEY, answer TEXT NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_accessed_at ON answers (accessed_at)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection for one transaction; connections are not shared across threads"""
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT answer FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE answers SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def set(self, key: str, answer: str) -> None:
+        size = len(answer.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, size, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, answer, size, time.time())
+            )
+            total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+            if total_bytes <= self.max_bytes:
+                return
+            # Delete the least recently used answers until the cache fits again
+            excess = total_bytes - self.max_bytes
+            evict_keys = []
+            for evict_key, evict_size in conn.execute("SELECT key, size FROM answers ORDER BY accessed_at"):
+                if excess <= 0:
+                    break
+                evict_keys.append((evict_key,))
+                excess -= evict_size
+            conn.executemany("DELETE FROM answers WHERE key = ?", evict_keys)
+
+class AnswerCacheService:
+    """
+    Caches LLM answers keyed on the normalized question, the ordered IDs of the
+    retrieved chunks, the model, the temperature and the prompt version.
+
+    The backend is selected by Settings.ANSWER_CACHE_BACKEND: "memory", "disk"
+    or "none".
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        backend = settings.ANSWER_CACHE_BACKEND
+        if backend == "memory":
+            self.backend = MemoryAnswerCache(settings.ANSWER_CACHE_MAX_BYTES)
+        elif backend == "disk":
+            self.backend = DiskAnswerCache(settings.ANSWER_CACHE_PATH, settings.ANSWER_CACHE_MAX_BYTES)
+        elif backend == "none":
+            self.backend = None
+        else:
+            raise ValueError(f"Unknown answer cache backend: {backend}")
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, chunk_ids: List[str], context: str, model: str, temperature: float, prompt_version: str) -> str:
+        """Build the cache key for an answer"""
+        payload = json.dumps({
+            "query": " ".join(query.lower().split()),
+            "chunk_ids": chunk_ids,
+            # The packed context depends on settings such as the token budget,
+            # which can cut the same chunks down differently
+            "context": context,
+            "model": model,
+            "temperature": temperature,
+            "prompt_version": prompt_version
+        }, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if self.backend is None:
+            return None
+        answer = self.backend.get(key)
+        record_cache_lookup("answer", answer is not None)
+        if answer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return answer
+
+    def set(self, key: str, answer: str) -> None:
+        if self.backend is not None:
+            self.backend.set(key, answer)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.settings.ANSWER_CACHE_BACKEND,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
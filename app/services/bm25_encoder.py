@@ -0,0 +1,102 @@
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+from scipy.sparse import csr_matrix
+from .corpus_stats_service import CorpusStats
+
+class BM25MatrixEncoder:
+    """
+    Vectorized BM25 sparse encoder.
+
+    Builds a term-document CSR matrix for the whole corpus and computes corpus
+    statistics and per-chunk BM25 term weights in a single pass, instead of
+    scoring every token against the corpus one at a time.
+
+    Document vectors carry the saturated, length-normalized term frequency; the
+    IDF half of BM25 lives in the returned CorpusStats and is applied to the
+    query vector, so the sparse dot product equals the BM25 score.
+    """
+
+    def __init__(self, token_index: Callable[[str], int], k1: float = 1.5, b: float = 0.75):
+        self.token_index = token_index
+        self.k1 = k1
+        self.b = b
+
+    def _build_term_matrix(self, tokenized_corpus: List[List[str]]):
+        """Build the term frequency matrix (documents x local terms)"""
+        vocabulary: Dict[str, int] = {}
+        columns: List[int] = []
+        indptr = [0]
+        for tokens in tokenized_corpus:
+            for token in tokens:
+                columns.append(vocabulary.setdefault(token, len(vocabulary)))
+            indptr.append(len(columns))
+
+        term_frequencies = csr_matrix(
+            (np.ones(len(columns), dtype=np.float64), np.asarray(columns, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(tokenized_corpus), len(vocabulary))
+        )
+        # Collapse repeated tokens within a document into a single term frequency entry
+        term_frequencies.sum_duplicates()
+        return term_frequencies, list(vocabulary)
+
+    def encode(self, tokenized_corpus: List[List[str]]) -> Tuple[List[Dict[str, List]], CorpusStats]:
+        """
+        Encode a tokenized corpus into Pinecone sparse vectors.
+
+        Returns one vector per document, in order (documents without tokens get
+        empty indices/values), and the corpus statistics.
+        """
+        if not tokenized_corpus:
+            return [], CorpusStats(0, 0.0, {})
+
+        doc_lengths = np.fromiter((len(tokens) for tokens in tokenized_corpus), dtype=np.float64, count=len(tokenized_corpus))
+        avg_doc_length = float(doc_lengths.mean())
+        sparse_vectors, doc_frequencies = self.encode_window(tokenized_corpus, avg_doc_length)
+        return sparse_vectors, CorpusStats(len(tokenized_corpus), avg_doc_length, doc_frequencies)
+
+    def encode_window(
+        self,
+        tokenized_corpus: List[List[str]],
+        avg_doc_length: float
+    ) -> Tuple[List[Dict[str, List]], Dict[str, int]]:
+        """
+        Encode one window of a larger corpus with a given average document length.
+
+        Returns one vector per document and the document frequencies of the
+        window's terms, so a streaming caller can accumulate corpus statistics.
+        """
+        term_frequencies, terms = self._build_term_matrix(tokenized_corpus)
+        num_docs = term_frequencies.shape[0]
+        if not terms:
+            return [{"indices": [], "values": []} for _ in range(num_docs)], {}
+
+        doc_lengths = np.fromiter((len(tokens) for tokens in tokenized_corpus), dtype=np.float64, count=num_docs)
+        doc_frequencies = np.bincount(term_frequencies.indices, minlength=len(terms))
+
+        # BM25 term frequency weights for every non-zero entry of the matrix at once
+        tf = term_frequencies.data
+        entry_rows = np.repeat(np.arange(num_docs), np.diff(term_frequencies.indptr))
+        length_norm = self.k1 * (1 - self.b + self.b * doc_lengths[entry_rows] / (avg_doc_length or 1.0))
+        weights = tf * (self.k1 + 1) / (tf + length_norm)
+
+        # Map local term ids to the hashed sparse indices
+        term_indices = np.fromiter((self.token_index(term) for term in terms), dtype=np.int64, count=len(terms))
+        entry_indices = term_indices[term_frequencies.indices]
+
+        sparse_vectors = []
+        for row in range(num_docs):
+            start, end = term_frequencies.indptr[row], term_frequencies.indptr[row + 1]
+            if start == end:
+                sparse_vectors.append({"indices": [], "values": []})
+                continue
+            # Sort by sparse index and sum weights of tokens that hash to the same index
+            order = np.argsort(entry_indices[start:end], kind="stable")
+            row_indices = entry_indices[start:end][order]
+            row_weights = weights[start:end][order]
+            unique_indices, first_positions = np.unique(row_indices, return_index=True)
+            sparse_vectors.append({
+                "indices": unique_indices.tolist(),
+                "values": np.add.reduceat(row_weights, first_positions).tolist()
+            })
+
+        return sparse_vectors, dict(zip(terms, doc_frequencies.tolist()))
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Tuple
+import threading
+import time
+from langchain.schema import Document
+from config.settings import Settings
+from .manifest_service import ManifestService
+from .metrics_service import record_cache_lookup
+
+class LRUTTLCache:
+    """Thread-safe LRU cache whose entries also expire after a fixed TTL"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return (hit, value) for a key"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class NamespaceGenerations:
+    """
+    Per-namespace generation counters. Bumping a namespace's generation makes
+    every cache entry keyed on the previous generation unreachable.
+    """
+
+    def __init__(self):
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str) -> int:
+        return self._generations.get(namespace, 0)
+
+    def bump(self, namespace: str) -> int:
+        with self._lock:
+            generation = self._generations.get(namespace, 0) + 1
+            self._generations[namespace] = generation
+            return generation
+
+# Shared by every service in the process, so an upload through one DocumentService
+# invalidates results cached by another
+namespace_generations = NamespaceGenerations()
+
+class RetrievalCache:
+    """
+    Caches similarity search results keyed on (namespace, normalized query, k),
+    the namespace generation and the version of the namespace's manifest, with
+    hit/miss counters. Uploads and deletes bump the generation in this process
+    and replace or remove the manifest, so other workers sharing the manifest
+    directory stop serving the old results too.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.manifest_service = ManifestService(settings)
+        self._cache = LRUTTLCache(settings.RETRIEVAL_CACHE_MAX_ENTRIES, settings.RETRIEVAL_CACHE_TTL_SECONDS)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def key(self, query: str, namespace: str, k: int) -> Tuple:
+        """
+        Build the cache key for a search. Take the key before searching and store
+        the result under it, so results fetched while an upload bumps the
+        generation or replaces the manifest are never cached under the new one.
+        """
+        return (
+            namespace,
+            namespace_generations.get(namespace),
+            self.manifest_service.version(namespace),
+            self.normalize_query(query),
+            k
+        )
+
+    def get(self, key: Tuple) -> Tuple[bool, List[Document]]:
+        hit, documents = self._cache.get(key)
+        record_cache_lookup("retrieval", hit)
+        if hit:
+            self.hits += 1
+            return True, list(documents)
+        self.misses += 1
+        return False, []
+
+    def set(self, key: Tuple, documents: List[Document]) -> None:
+        self._cache.set(key, list(documents))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "size": len(self._cache),
+            "max_entries": self._cache.max_entries,
+            "ttl_seconds": self._cache.ttl_seconds
+        }
@@ -2,19 +2,25 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 from typing import List
 from config.settings import Settings
+from .metrics_service import span
+import logging
+
+logger = logging.getLogger(__name__)
 
 class ChunkingService:
     def __init__(self, settings: Settings):
         self.settings = settings
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP
+            chunk_overlap=settings.CHUNK_OVERLAP,
+            # Record where each chunk starts in its page, so overlapping chunks can be merged at query time
+            add_start_index=True
         )
 
     def chunk_documents(self, documents: List[Document]) -> List[Document]:
         """
         Split documents into chunks
         """
-
-        print("chunking_service: Chunking documents...")
-        return self.text_splitter.split_documents(documents) 
\ No newline at end of file
+        logger.debug("Chunking %d documents...", len(documents))
+        with span("chunk", documents=len(documents)):
+            return self.text_splitter.split_documents(documents) 
\ No newline at end of file
@@ -0,0 +1,195 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+from langchain.schema import Document
+from config.settings import Settings
+from .metrics_service import span, tokens_total
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Separator placed between packed segments in the prompt
+SEGMENT_SEPARATOR = "\n\n"
+
+# Chunks of a page this many characters apart or less are merged into one segment
+MAX_MERGE_GAP = 2
+
+# Shortest suffix/prefix overlap trusted when merging chunks without a start index
+MIN_TEXT_OVERLAP = 20
+
+@dataclass
+class _Segment:
+    """A contiguous span of one page built from one or more chunks"""
+    page: Any
+    text: str
+    start: Optional[int]
+    end: Optional[int]
+    rank: int
+    documents: List[Document] = field(default_factory=list)
+
+@dataclass
+class PackedContext:
+    context: str
+    documents: List[Document]
+    tokens: int
+    tokens_saved: int
+
+class ContextPackerService:
+    """
+    Assembles the LLM context from retrieved chunks. Overlapping and adjacent
+    chunks of the same page are merged into a single span, and the spans are
+    added in score order until the token budget is reached.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self._encoding = None
+        self._count_tokens: Optional[Callable[[str], int]] = None
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens with the model's tiktoken encoding, or estimate them if it is unavailable"""
+        if self._count_tokens is None:
+            try:
+                import tiktoken
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.settings.LLM_MODEL)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+                self._count_tokens = lambda text: len(self._encoding.encode(text, disallowed_special=()))
+            except Exception as e:
+                # tiktoken is missing or cannot fetch its encoding files
+                logger.warning("tiktoken unavailable (%s), estimating tokens from length", e)
+                self._count_tokens = lambda text: (len(text) + 3) // 4
+        return self._count_tokens(text)
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text down to at most max_tokens tokens"""
+        if self._encoding is not None:
+            return self._encoding.decode(self._encoding.encode(text, disallowed_special=())[:max_tokens])
+        return text[:max_tokens * 4]
+
+    @staticmethod
+    def _merge_by_position(segment: _Segment, doc: Document, start: int) -> bool:
+        """Extend a segment with a chunk that starts inside or right after it"""
+        if segment.start is None or start < segment.start or start > segment.end + MAX_MERGE_GAP:
+            return False
+        text = doc.page_content
+        end = start + len(text)
+        if end > segment.end:
+            if start >= segment.end:
+                # Adjacent rather than overlapping, the splitter dropped the whitespace between them
+                segment.text += " " + text
+            else:
+                segment.text += text[segment.end - start:]
+            segment.end = end
+        return True
+
+    @staticmethod
+    def _merge_by_text(segment: _Segment, doc: Document) -> bool:
+        """Merge a chunk without a start index into a segment it overlaps textually"""
+        text = doc.page_content
+        if text in segment.text:
+            return True
+        if segment.text in text:
+            segment.text = text
+            return True
+        max_overlap = min(len(segment.text), len(text)) - 1
+        for size in range(max_overlap, MIN_TEXT_OVERLAP - 1, -1):
+            if segment.text.endswith(text[:size]):
+                segment.text += text[size:]
+                return True
+            if text.endswith(segment.text[:size]):
+                segment.text = text + segment.text[size:]
+                return True
+        return False
+
+    def _build_segments(self, documents: List[Document]) -> List[_Segment]:
+        """Merge the chunks of each page into segments ranked by their best chunk"""
+        by_page = {}
+        for rank, doc in enumerate(documents):
+            by_page.setdefault(doc.metadata.get("page"), []).append((rank, doc))
+
+        segments = []
+        for page, ranked in by_page.items():
+            positioned = sorted(
+                (item for item in ranked if item[1].metadata.get("start_index") is not None),
+                key=lambda item: item[1].metadata["start_index"]
+            )
+            unpositioned = [item for item in ranked if item[1].metadata.get("start_index") is None]
+
+            page_segments: List[_Segment] = []
+            for rank, doc in positioned:
+                start = int(doc.metadata["start_index"])
+                last = page_segments[-1] if page_segments else None
+                if last is None or not self._merge_by_position(last, doc, start):
+                    end = start + len(doc.page_content)
+                    last = _Segment(page=page, text=doc.page_content, start=start, end=end, rank=rank)
+                    page_segments.append(last)
+                last.rank = min(last.rank, rank)
+                last.documents.append(doc)
+
+            for rank, doc in unpositioned:
+                for segment in page_segments:
+                    if self._merge_by_text(segment, doc):
+                        break
+                else:
+                    segment = _Segment(page=page, text=doc.page_content, start=None, end=None, rank=rank)
+                    page_segments.append(segment)
+                segment.rank = min(segment.rank, rank)
+                segment.documents.append(doc)
+
+            segments.extend(page_segments)
+
+        return sorted(segments, key=lambda segment: segment.rank)
+
+    def pack(self, documents: List[Document]) -> PackedContext:
+        """
+        Build the context for documents ordered by score.
+
+        Returns the context, the documents it covers in score order, its token
+        count and the tokens saved compared with joining every chunk. Each chunk
+        is tokenized once: the counts of the joined chunks and of the packed
+        context are summed from per-chunk and per-segment counts, and only
+        segments merged from several chunks are tokenized again.
+        """
+        if not self.settings.CONTEXT_PACKING_ENABLED:
+            naive_context = SEGMENT_SEPARATOR.join(doc.page_content for doc in documents)
+            return PackedContext(naive_context, list(documents), self.count_tokens(naive_context), 0)
+
+        budget = self.settings.CONTEXT_TOKEN_BUDGET
+        separator_tokens = self.count_tokens(SEGMENT_SEPARATOR)
+        chunk_tokens = {id(doc): self.count_tokens(doc.page_content) for doc in documents}
+        naive_tokens = sum(chunk_tokens.values()) + separator_tokens * max(0, len(documents) - 1)
+        segments = self._build_segments(documents)
+        packed: List[_Segment] = []
+        texts: List[str] = []
+        tokens = 0
+        for segment in segments:
+            if len(segment.documents) == 1 and segment.text == segment.documents[0].page_content:
+                text_tokens = chunk_tokens[id(segment.documents[0])]
+            else:
+                text_tokens = self.count_tokens(segment.text)
+            segment_tokens = text_tokens + (separator_tokens if texts else 0)
+            if tokens + segment_tokens > budget:
+                # Keep looking, a smaller lower-ranked segment may still fit
+                continue
+            packed.append(segment)
+            texts.append(segment.text)
+            tokens += segment_tokens
+
+        if not packed and segments:
+            # Even the best segment is over budget, so send as much of it as fits
+            packed.append(segments[0])
+            texts.append(self._truncate(segments[0].text, budget))
+            tokens = self.count_tokens(texts[0])
+
+        context = SEGMENT_SEPARATOR.join(texts)
+        ranks = {id(doc): rank for rank, doc in enumerate(documents)}
+        packed_documents = sorted(
+            (doc for segment in packed for doc in segment.documents),
+            key=lambda doc: ranks[id(doc)]
+        )
+        logger.debug(
+            "Packed %d chunks into %d segments, %d tokens (%d saved)",
+            len(documents), len(packed), tokens, naive_tokens - tokens
+        )
+        return PackedContext(context, packed_documents, tokens, max(0, naive_tokens - tokens))
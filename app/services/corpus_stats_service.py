@@ -0,0 +1,127 @@
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+from urllib.parse import quote
+import json
+import math
+import os
+from config.settings import Settings
+from .json_store import write_json_atomic
+
+class CorpusStats:
+    """
+    BM25 corpus statistics for one namespace: document count, average document
+    length and per-token document frequencies. IDF values are precomputed so a
+    query token costs a single dictionary lookup.
+    """
+
+    def __init__(self, doc_count: int, avg_doc_length: float, doc_frequencies: Dict[str, int]):
+        self.doc_count = doc_count
+        self.avg_doc_length = avg_doc_length
+        self.doc_frequencies = doc_frequencies
+        # Same smoothed IDF as the matrix encoder, always positive
+        self.idf = {
+            token: math.log1p((doc_count - df + 0.5) / (df + 0.5))
+            for token, df in doc_frequencies.items()
+        }
+
+    @classmethod
+    def from_tokenized_corpus(cls, tokenized_corpus: List[List[str]]) -> "CorpusStats":
+        """Compute statistics for a tokenized corpus"""
+        doc_frequencies = Counter()
+        for tokens in tokenized_corpus:
+            doc_frequencies.update(set(tokens))
+        total_length = sum(len(tokens) for tokens in tokenized_corpus)
+        doc_count = len(tokenized_corpus)
+        return cls(doc_count, total_length / doc_count if doc_count else 0.0, dict(doc_frequencies))
+
+    @classmethod
+    def from_term_frequencies(cls, documents: List[Tuple[Counter, int]]) -> "CorpusStats":
+        """Compute statistics for documents given as (term frequencies, length) pairs"""
+        doc_frequencies = Counter()
+        for term_frequencies, _ in documents:
+            doc_frequencies.update(term_frequencies.keys())
+        total_length = sum(length for _, length in documents)
+        doc_count = len(documents)
+        return cls(doc_count, total_length / doc_count if doc_count else 0.0, dict(doc_frequencies))
+
+    def to_dict(self) -> Dict:
+        return {
+            "doc_count": self.doc_count,
+            "avg_doc_length": self.avg_doc_length,
+            "doc_frequencies": self.doc_frequencies
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CorpusStats":
+        return cls(data["doc_count"], data["avg_doc_length"], data["doc_frequencies"])
+
+class CorpusStatsAccumulator:
+    """Accumulates corpus statistics over windows of a streamed corpus"""
+
+    def __init__(self):
+        self.doc_count = 0
+        self.total_length = 0
+        self.doc_frequencies = Counter()
+
+    @property
+    def avg_doc_length(self) -> float:
+        return self.total_length / self.doc_count if self.doc_count else 0.0
+
+    def add_documents(self, tokenized_corpus: List[List[str]]) -> None:
+        """Count document lengths of a window"""
+        self.doc_count += len(tokenized_corpus)
+        self.total_length += sum(len(tokens) for tokens in tokenized_corpus)
+
+    def add_doc_frequencies(self, doc_frequencies: Dict[str, int]) -> None:
+        """Add document frequencies of a window"""
+        self.doc_frequencies.update(doc_frequencies)
+
+    def to_stats(self) -> CorpusStats:
+        return CorpusStats(self.doc_count, self.avg_doc_length, dict(self.doc_frequencies))
+
+class CorpusStatsService:
+    """
+    Stores corpus statistics per namespace on disk at ingestion time and loads
+    them lazily for query encoding. Files are replaced atomically, and a cached
+    entry is reloaded when its file changes, so all workers see the same stats.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.stats_dir = Path(settings.CORPUS_STATS_DIR)
+        self._cache: Dict[str, Tuple[int, CorpusStats]] = {}
+
+    def _path(self, namespace: str) -> Path:
+        return self.stats_dir / f"{quote(namespace, safe='')}.json"
+
+    def save(self, namespace: str, stats: CorpusStats) -> None:
+        """Persist statistics for a namespace"""
+        write_json_atomic(self._path(namespace), stats.to_dict())
+        self._cache.pop(namespace, None)
+
+    def get(self, namespace: str) -> Optional[CorpusStats]:
+        """Get statistics for a namespace, or None if it was never ingested with stats"""
+        path = self._path(namespace)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self._cache.pop(namespace, None)
+            return None
+
+        cached = self._cache.get(namespace)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with open(path) as f:
+            stats = CorpusStats.from_dict(json.load(f))
+        self._cache[namespace] = (mtime, stats)
+        return stats
+
+    def delete(self, namespace: str) -> None:
+        """Remove statistics for a namespace"""
+        self._cache.pop(namespace, None)
+        try:
+            os.unlink(self._path(namespace))
+        except FileNotFoundError:
+            pass
@@ -1,14 +1,29 @@
-from langchain_community.document_loaders import PyPDFLoader
 from langchain.schema import Document
-from typing import List
+from typing import List, Optional, Iterator, Iterable, Dict, Any, Union, Callable
 from config.settings import Settings
 from .chunking_service import ChunkingService
 from .embedding_service import EmbeddingService
+from .corpus_stats_service import CorpusStatsAccumulator
 from .vector_store_service import VectorStoreService
+from .download_service import DownloadService
+from .upload_service import UploadService
+from .manifest_service import ManifestService
+from .namespace_catalog_service import NamespaceCatalogService
+from .namespace_alias_service import NamespaceAliasService, parse_version
+from .pdf_loader import ParallelPDFLoader
+from .cache_service import RetrievalCache, namespace_generations
+from .ingestion_job_service import IngestionProgress, IngestionCancelledError
+from .metrics_service import span
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import logging
+import multiprocessing
 import os
+import threading
+import time
 from pathlib import Path
-import requests
-import tempfile
+
+logger = logging.getLogger(__name__)
 
 class DocumentService:
     def __init__(self, settings: Settings):
@@ -16,6 +31,14 @@ class DocumentService:
         self.chunking_service = ChunkingService(settings)
         self.embedding_service = EmbeddingService(settings)
         self.vector_store_service = VectorStoreService(settings, self.embedding_service)
+        self.download_service = DownloadService(settings)
+        self.upload_service = UploadService(settings)
+        self.manifest_service = ManifestService(settings)
+        self.namespace_aliases = NamespaceAliasService(settings)
+        self.namespace_catalog = NamespaceCatalogService(settings, self.vector_store_service, self.namespace_aliases)
+        self.retrieval_cache = RetrievalCache(settings)
+        self._parse_executor: Optional[ProcessPoolExecutor] = None
+        self._parse_executor_lock = threading.Lock()
         
         # Ensure data directory exists
         self._ensure_data_directory()
@@ -31,17 +54,261 @@ class DocumentService:
                 "Please create the 'data' directory in the project root."
             )
 
-    def process_and_upload_document(self, namespace: str):
+    def _pdf_loader(self, file_path: str):
+        """
+        Get a loader for a PDF file: a process-pool ParallelPDFLoader when
+        Settings.PDF_PARSE_WORKERS is above 1, otherwise PyPDFLoader
+        """
+        if self.settings.PDF_PARSE_WORKERS <= 1:
+            # Imported here to keep langchain_community off the API's import path
+            from langchain_community.document_loaders import PyPDFLoader
+            return PyPDFLoader(file_path)
+
+        with self._parse_executor_lock:
+            if self._parse_executor is None:
+                # Spawn rather than fork, since the API process runs worker threads
+                self._parse_executor = ProcessPoolExecutor(
+                    max_workers=self.settings.PDF_PARSE_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+        return ParallelPDFLoader(
+            file_path,
+            self._parse_executor,
+            pages_per_task=self.settings.PDF_PARSE_PAGES_PER_TASK,
+            max_pending_tasks=self.settings.PDF_PARSE_WORKERS * 2
+        )
+
+    def _iter_chunk_windows(self, file_path: str, progress: IngestionProgress) -> Iterator[List[Document]]:
+        """
+        Lazily load a PDF page by page and yield its chunks in windows of
+        Settings.INGESTION_WINDOW_CHUNKS
+        """
+        pages = iter(self._pdf_loader(file_path).lazy_load())
+        window: List[Document] = []
+        while True:
+            # Pages are parsed lazily, so each page is timed as a load
+            with span("load"):
+                page = next(pages, None)
+            if page is None:
+                break
+            progress.check_cancelled()
+            chunks = self.chunking_service.chunk_documents([page])
+            progress.add_chunks(len(chunks))
+            window.extend(chunks)
+            if len(window) >= self.settings.INGESTION_WINDOW_CHUNKS:
+                yield window
+                window = []
+                progress.set_stage("parse")
+        if window:
+            yield window
+
+    def _process_pdf(self, file_path: str, namespace: str, progress: IngestionProgress, source: Optional[str] = None):
+        """
+        Ingest a PDF file and record the namespace in the catalog.
+
+        By default only the chunks that changed since the last ingestion are
+        upserted into the namespace, so queries during the upload may see a mix
+        of old and new chunks. With Settings.NAMESPACE_REINDEX_MODE "shadow", or
+        when the namespace has vectors but no manifest so every vector would be
+        replaced, the whole document is uploaded into a new version of the
+        namespace while queries keep reading the current one, and the namespace's
+        alias is flipped to it once the upload completes. The replaced version is
+        deleted in the background.
+        """
+        started = time.perf_counter()
+        if self.settings.NAMESPACE_REINDEX_MODE == "shadow" or self._is_unmanifested(namespace):
+            shadow = self.namespace_aliases.new_version(namespace)
+            logger.info("Ingesting into shadow namespace: %s", shadow)
+            try:
+                chunk_count, vector_count = self._ingest_pdf(file_path, shadow, progress)
+            except BaseException:
+                self._delete_version(shadow)
+                self.namespace_aliases.discard_versions(namespace, [shadow])
+                raise
+            previous = self.namespace_aliases.flip(namespace, shadow)
+            self._schedule_gc(namespace, previous)
+        else:
+            chunk_count, vector_count = self._ingest_pdf(file_path, self.namespace_aliases.resolve(namespace), progress)
+        self.namespace_catalog.record(
+            namespace,
+            vector_count=vector_count,
+            chunk_count=chunk_count,
+            source=source or file_path,
+            ingest_seconds=time.perf_counter() - started
+        )
+
+    def _is_unmanifested(self, namespace: str) -> bool:
+        """Whether a namespace has vectors but no manifest, e.g. ingested before manifests existed"""
+        physical = self.namespace_aliases.resolve(namespace)
+        return self.manifest_service.get(physical) is None and physical in self.vector_store_service.list_namespaces()
+
+    def _delete_version(self, physical: str) -> None:
+        """Delete the vectors and per-namespace data of a namespace of the vector store"""
+        try:
+            if physical in self.vector_store_service.list_namespaces():
+                self.vector_store_service.delete_namespace(physical)
+            self.embedding_service.corpus_stats.delete(physical)
+            self.embedding_service.reranker.drop(physical)
+            self.manifest_service.delete(physical)
+            namespace_generations.bump(physical)
+        except Exception:
+            logger.exception("Failed to delete namespace version: %s", physical)
+
+    def _schedule_gc(self, namespace: str, previous: str) -> None:
+        """Delete the version a namespace pointed at, and any older ones, after Settings.NAMESPACE_GC_DELAY_SECONDS"""
+        timer = threading.Timer(self.settings.NAMESPACE_GC_DELAY_SECONDS, self._collect_versions, (namespace, previous))
+        timer.daemon = True
+        timer.start()
+
+    def _collect_versions(self, namespace: str, previous: str) -> None:
+        target = self.namespace_aliases.resolve(namespace)
+        stale = {previous} - {target}
+        current = parse_version(target)
+        if current is not None:
+            # Recorded versions older than the current one, e.g. left behind by a
+            # restart before their GC ran. Namespaces that merely look versioned
+            # were not created here and are never deleted.
+            for physical in self.namespace_aliases.versions(namespace):
+                if parse_version(physical)[1] < current[1]:
+                    stale.add(physical)
+        for physical in stale:
+            logger.info("Deleting replaced version %s of namespace: %s", physical, namespace)
+            self._delete_version(physical)
+        self.namespace_aliases.discard_versions(namespace, stale)
+
+    def _ingest_pdf(self, file_path: str, namespace: str, progress: IngestionProgress):
+        """
+        Load, chunk, encode and upload a PDF file, reporting progress per stage.
+        Returns the chunk count and the vector count of the namespace.
+        """
+        if self.settings.INGESTION_STREAMING:
+            return self._process_pdf_streaming(file_path, namespace, progress)
+
+        # Load PDF
+        progress.set_stage("parse")
+        loader = self._pdf_loader(file_path)
+        with span("load"):
+            documents = loader.load()
+        progress.check_cancelled()
+        
+        # Split into chunks
+        progress.set_stage("chunk")
+        chunks = self.chunking_service.chunk_documents(documents)
+        progress.add_chunks(len(chunks))
+        progress.check_cancelled()
+        
+        # Prepare vectors for upload
+        progress.set_stage("encode")
+        vectors = self.embedding_service.prepare_vectors_for_upload(
+            chunks,
+            namespace
+        )
+        progress.add_encoded(len(chunks))
+        progress.check_cancelled()
+        
+        # Upload to vector store
+        progress.set_stage("upsert")
+        stats = self.embedding_service.corpus_stats.get(namespace)
+        avg_doc_length = stats.avg_doc_length if stats is not None else 0.0
+        return self._upload_changed_vectors(vectors, namespace, progress, lambda: avg_doc_length)
+
+    def _process_pdf_streaming(self, file_path: str, namespace: str, progress: IngestionProgress):
+        """
+        Stream a PDF through chunking, encoding and upload in bounded windows.
+        
+        Pages are parsed while earlier windows are being upserted, and only one
+        window of chunks plus the in-flight upsert batches are held in memory.
+        """
+        progress.set_stage("parse")
+        windows = self._iter_chunk_windows(file_path, progress)
+        accumulator = CorpusStatsAccumulator()
+        vectors = self.embedding_service.iter_vectors_for_upload(
+            windows, namespace, progress=progress, accumulator=accumulator
+        )
+        return self._upload_changed_vectors(vectors, namespace, progress, lambda: accumulator.avg_doc_length)
+
+    def _upload_changed_vectors(
+        self,
+        vectors: Iterable[Dict[str, Any]],
+        namespace: str,
+        progress: IngestionProgress,
+        avg_doc_length: Callable[[], float]
+    ):
+        """
+        Upsert only vectors whose content-addressed IDs are not yet in the namespace
+        manifest, then delete the chunks that are no longer part of the document.
+        avg_doc_length returns the average chunk length the vectors are encoded with.
+        Returns the chunk count and the vector count of the namespace.
+        """
+        previous_ids = self.manifest_service.get(namespace)
+        if previous_ids is None:
+            if namespace in self.vector_store_service.list_namespaces():
+                # Ingested before manifests existed, so its chunk IDs are unknown
+                logger.warning("No manifest for existing namespace: %s, replacing all vectors", namespace)
+                self.vector_store_service.delete_namespace(namespace)
+            previous_ids = set()
+        encoded_avg_doc_length = self.manifest_service.avg_doc_length(namespace) if previous_ids else None
+        tolerance = self.settings.BM25_REENCODE_TOLERANCE
+
+        current_ids = set()
+        chunk_count = 0
+        reencode = False
+
+        def changed_vectors():
+            nonlocal chunk_count, reencode
+            for vector in vectors:
+                chunk_count += 1
+                current_ids.add(vector["id"])
+                # Unchanged chunks keep the BM25 weights they were encoded with, normalized by
+                # the average chunk length at the time. Within the tolerance they are skipped
+                # and score slightly differently from a full re-ingest; beyond it every chunk
+                # is re-upserted. In streaming mode the check uses the running average, so
+                # chunks skipped before it moves are not revisited.
+                if not reencode and (
+                    encoded_avg_doc_length is None
+                    or abs(avg_doc_length() - encoded_avg_doc_length) > tolerance * encoded_avg_doc_length
+                ):
+                    if encoded_avg_doc_length is not None:
+                        logger.info(
+                            "Average chunk length of namespace %s moved from %.1f to %.1f, re-upserting unchanged chunks",
+                            namespace, encoded_avg_doc_length, avg_doc_length()
+                        )
+                    reencode = True
+                if reencode or vector["id"] not in previous_ids:
+                    yield vector
+
+        report = self.vector_store_service.upload_vectors(changed_vectors(), namespace, progress=progress)
+
+        removed_ids = previous_ids - current_ids
+        if removed_ids:
+            progress.check_cancelled()
+            self.vector_store_service.delete_vectors(removed_ids, namespace)
+            self.embedding_service.reranker.remove(namespace, removed_ids)
+        self.manifest_service.save(
+            namespace,
+            current_ids,
+            avg_doc_length=avg_doc_length() if reencode else encoded_avg_doc_length
+        )
+        namespace_generations.bump(namespace)
+
+        logger.info(
+            "Namespace %s: %d chunks upserted, %d unchanged, %d removed",
+            namespace, report["vectors"], len(current_ids) - report["vectors"], len(removed_ids)
+        )
+        return chunk_count, len(current_ids)
+
+    def process_and_upload_document(self, namespace: str, progress: Optional[IngestionProgress] = None):
         """
         Process PDF document and upload to vector store
         
         Args:
             namespace: Required namespace to upload vectors to
+            progress: Optional progress hooks of the ingestion job running this
         """
         if not namespace:
             raise ValueError("Namespace is required for document processing")
 
-        print(f"document_service: Processing and uploading document to namespace: {namespace}")
+        logger.info("Processing and uploading document to namespace: %s", namespace)
         # Check if PDF exists
         if not os.path.exists(self.settings.PDF_PATH):
             raise FileNotFoundError(
@@ -49,72 +316,99 @@ class DocumentService:
                 "Please ensure the PDF file is in the data directory."
             )
 
-        # Load PDF
-        loader = PyPDFLoader(self.settings.PDF_PATH)
-        documents = loader.load()
-        
-        # Split into chunks
-        chunks = self.chunking_service.chunk_documents(documents)
-        
-        # Prepare vectors for upload
-        vectors = self.embedding_service.prepare_vectors_for_upload(
-            chunks,
-            namespace
-        )
+        self._process_pdf(self.settings.PDF_PATH, namespace, progress or IngestionProgress())
+
+    def process_and_upload_file(
+        self,
+        file_path: str,
+        namespace: str,
+        progress: Optional[IngestionProgress] = None,
+        source: Optional[str] = None
+    ):
+        """
+        Process a local PDF file and upload it to the vector store
         
-        # Upload to vector store
-        self.vector_store_service.upload_vectors(vectors, namespace)
+        Args:
+            file_path: Path of the PDF file, e.g. from resolve_local_path or download_document
+            namespace: Required namespace to upload vectors to
+            progress: Optional progress hooks of the ingestion job running this
+            source: URL or name of the document for the namespace catalog, defaults to file_path
+        """
+        if not namespace:
+            raise ValueError("Namespace is required for document processing")
+
+        logger.info("Processing and uploading %s to namespace: %s", file_path, namespace)
+        self._process_pdf(file_path, namespace, progress or IngestionProgress(), source=source)
 
-    def process_and_upload_url_document(self, url: str, title: str):
+    def resolve_local_path(self, path: str) -> str:
+        """
+        Resolve a server-side PDF path for ingestion. Relative paths are taken
+        from Settings.INGESTION_LOCAL_ROOT, and the file must be inside it.
+
+        Raises:
+            ValueError: if the path is outside the root or not a PDF
+            FileNotFoundError: if the file does not exist
+        """
+        root = Path(self.settings.INGESTION_LOCAL_ROOT).resolve()
+        file_path = (root / path).resolve()
+        if root not in file_path.parents:
+            raise ValueError(f"Path must be inside the ingestion root directory: {path}")
+        if file_path.suffix.lower() != ".pdf":
+            raise ValueError(f"Path must point to a PDF file: {path}")
+        if not file_path.is_file():
+            raise FileNotFoundError(f"PDF file not found: {path}")
+        return str(file_path)
+
+    def download_document(self, url: str, progress: Optional[IngestionProgress] = None) -> str:
+        """
+        Download a PDF into the local download cache and return the path of the
+        caller's own link to it, to be removed with release_download()
+        """
+        progress = progress or IngestionProgress()
+        progress.set_stage("download")
+        return self.download_service.download(url, progress=progress)
+
+    def release_download(self, file_path: str) -> None:
+        """Remove a path returned by download_document"""
+        self.download_service.release(file_path)
+
+    def process_and_upload_url_document(self, url: str, title: str, progress: Optional[IngestionProgress] = None):
         """
         Process PDF document from URL and upload to vector store with custom namespace
         
         Args:
             url: URL of the PDF document
             title: Title to use as namespace
+            progress: Optional progress hooks of the ingestion job running this
         """
         if not title:
             raise ValueError("Title is required for URL document processing")
 
-        print(f"document_service: Processing and uploading document from URL: {url} to namespace: {title}")
+        logger.info("Processing and uploading document from URL: %s to namespace: %s", url, title)
+        progress = progress or IngestionProgress()
         
         try:
-            # Download PDF to temporary file
-            response = requests.get(url)
-            response.raise_for_status()
-            
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                temp_file.write(response.content)
-                temp_file_path = temp_file.name
-            
+            # Download PDF into the local download cache
+            file_path = self.download_document(url, progress=progress)
             try:
-                # Load PDF using PyPDFLoader
-                loader = PyPDFLoader(temp_file_path)
-                documents = loader.load()
-                
-                # Split into chunks
-                chunks = self.chunking_service.chunk_documents(documents)
-                
-                # Prepare vectors for upload with custom namespace
-                vectors = self.embedding_service.prepare_vectors_for_upload(
-                    chunks,
-                    title
-                )
-                
-                # Upload to vector store
-                self.vector_store_service.upload_vectors(vectors, title)
-                
+                progress.check_cancelled()
+                self._process_pdf(file_path, title, progress, source=url)
             finally:
-                # Clean up the temporary file
-                os.unlink(temp_file_path)
+                self.release_download(file_path)
             
+        except IngestionCancelledError:
+            raise
         except Exception as e:
             raise Exception(f"Failed to process PDF from URL: {str(e)}")
 
     def similarity_search(self, query: str, namespace: str, k: int = 30) -> List[Document]:
         """
-        Search for similar documents
+        Search for similar documents. Aliased namespaces are searched in the
+        version they point at.
+
+        With Settings.RERANK_ENABLED, RERANK_OVERFETCH times k candidates are
+        fetched from the vector store and reranked with the namespace's cached
+        BM25 model down to k.
         
         Args: 
             query: The search query
@@ -123,15 +417,124 @@ class DocumentService:
         """
         if not namespace:
             raise ValueError("Namespace is required for similarity search")
-            
-        return self.vector_store_service.similarity_search(query, namespace, k=k)
+
+        namespace = self.namespace_aliases.resolve(namespace)
+        with span("retrieve", namespace=namespace, k=k):
+            cache_key = self.retrieval_cache.key(query, namespace, k)
+            hit, documents = self.retrieval_cache.get(cache_key)
+            if hit:
+                return documents
+
+            if self.settings.RERANK_ENABLED:
+                candidates = self.vector_store_service.similarity_search(query, namespace, k=self._fetch_k(k))
+                documents = self.embedding_service.search(query, candidates, k=k, namespace=namespace)
+            else:
+                documents = self.vector_store_service.similarity_search(query, namespace, k=k)
+            self.retrieval_cache.set(cache_key, documents)
+            return documents
+
+    async def asimilarity_search(self, query: str, namespace: str, k: int = 30) -> List[Document]:
+        """
+        Async counterpart of similarity_search; awaits the vector store query and
+        runs query encoding and reranking on worker threads instead of blocking
+        the event loop
+        """
+        if not namespace:
+            raise ValueError("Namespace is required for similarity search")
+
+        namespace = self.namespace_aliases.resolve(namespace)
+        with span("retrieve", namespace=namespace, k=k):
+            cache_key = self.retrieval_cache.key(query, namespace, k)
+            hit, documents = self.retrieval_cache.get(cache_key)
+            if hit:
+                return documents
+
+            if self.settings.RERANK_ENABLED:
+                candidates = await self.vector_store_service.asimilarity_search(query, namespace, k=self._fetch_k(k))
+                documents = await asyncio.to_thread(
+                    self.embedding_service.search, query, candidates, k=k, namespace=namespace
+                )
+            else:
+                documents = await self.vector_store_service.asimilarity_search(query, namespace, k=k)
+            self.retrieval_cache.set(cache_key, documents)
+            return documents
+
+    def similarity_search_batch(
+        self,
+        queries: List[str],
+        namespaces: List[str],
+        ks: List[int]
+    ) -> List[Union[List[Document], Exception]]:
+        """
+        Search for several queries at once. Cached results are reused, and the
+        remaining queries are encoded together and searched concurrently.
+
+        Returns the documents of each query, or the exception its search raised.
+        """
+        if not all(namespaces):
+            raise ValueError("Namespace is required for similarity search")
+
+        namespaces = [self.namespace_aliases.resolve(namespace) for namespace in namespaces]
+        with span("retrieve_batch", queries=len(queries)):
+            results: List[Union[List[Document], Exception]] = [None] * len(queries)
+            misses = []
+            for i, (query, namespace, k) in enumerate(zip(queries, namespaces, ks)):
+                cache_key = self.retrieval_cache.key(query, namespace, k)
+                hit, documents = self.retrieval_cache.get(cache_key)
+                if hit:
+                    results[i] = documents
+                else:
+                    misses.append((i, cache_key))
+
+            if not misses:
+                return results
+
+            fetch_ks = [
+                self._fetch_k(ks[i]) if self.settings.RERANK_ENABLED else ks[i]
+                for i, _ in misses
+            ]
+            searched = self.vector_store_service.similarity_search_batch(
+                [queries[i] for i, _ in misses],
+                [namespaces[i] for i, _ in misses],
+                fetch_ks
+            )
+            for (i, cache_key), documents in zip(misses, searched):
+                if not isinstance(documents, Exception):
+                    if self.settings.RERANK_ENABLED:
+                        documents = self.embedding_service.search(queries[i], documents, k=ks[i], namespace=namespaces[i])
+                    self.retrieval_cache.set(cache_key, documents)
+                results[i] = documents
+            return results
+
+    def _fetch_k(self, k: int) -> int:
+        """Number of candidates to fetch from the vector store for reranking down to k"""
+        return max(k, min(k * self.settings.RERANK_OVERFETCH, self.settings.RERANK_MAX_CANDIDATES))
 
     def delete_document(self, namespace: str) -> None:
-        """Delete all documents from a namespace"""
+        """Delete all documents from a namespace, and its alias"""
         if not namespace:
             raise ValueError("Namespace is required")
-        self.vector_store_service.delete_namespace(namespace)
+        physical = self.namespace_aliases.resolve(namespace)
+        self.vector_store_service.delete_namespace(physical)
+        self.embedding_service.corpus_stats.delete(physical)
+        self.embedding_service.reranker.drop(physical)
+        self.manifest_service.delete(physical)
+        # Replaced or unfinished versions would be untracked once the alias is gone
+        for version in self.namespace_aliases.versions(namespace):
+            if version != physical:
+                self._delete_version(version)
+        self.namespace_aliases.remove(namespace)
+        self.namespace_catalog.remove(namespace)
+        namespace_generations.bump(physical)
 
     def list_namespaces(self) -> List[str]:
-        """List all namespaces in the vector store"""
-        return self.vector_store_service.list_namespaces() 
\ No newline at end of file
+        """List all namespaces in the vector store, from the namespace catalog"""
+        return [entry["namespace"] for entry in self.namespace_catalog.list()]
+
+    def list_namespace_entries(self) -> List[Dict[str, Any]]:
+        """List the namespace catalog entries with per-namespace stats"""
+        return self.namespace_catalog.list()
+
+    def get_namespace(self, namespace: str) -> Optional[Dict[str, Any]]:
+        """Get the namespace catalog entry of a namespace, or None if it does not exist"""
+        return self.namespace_catalog.get(namespace) 
\ No newline at end of file
@@ -0,0 +1,193 @@
+from typing import Any, Dict, Optional
+from pathlib import Path
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config.settings import Settings
+from .ingestion_job_service import IngestionProgress
+from .json_store import write_json_atomic
+from .metrics_service import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+class DownloadTooLargeError(Exception):
+    """Raised when a download exceeds Settings.DOWNLOAD_MAX_BYTES"""
+
+class DownloadService:
+    """
+    Downloads PDFs over a pooled HTTP session, streaming them to a local cache
+    keyed by URL. Cached files are revalidated with ETag/Last-Modified, so
+    re-ingesting the same URL skips the transfer when it has not changed.
+
+    Each download hands the caller its own hard link to the cached file, which
+    it removes with release() once the document has been parsed. Evicting or
+    re-downloading the cache entry meanwhile only replaces the cache's link, so
+    the file a job is parsing never disappears or changes underneath it, also
+    when the cache is shared by several workers.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.cache_dir = Path(settings.DOWNLOAD_CACHE_DIR)
+        self.in_use_dir = self.cache_dir / "in_use"
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=settings.DOWNLOAD_POOL_SIZE,
+            pool_maxsize=settings.DOWNLOAD_POOL_SIZE,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=(429, 502, 503, 504),
+                allowed_methods=("GET",)
+            )
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._download_slots = threading.BoundedSemaphore(max(1, settings.DOWNLOAD_MAX_CONCURRENT))
+        # Serializes eviction with handing out cached files
+        self._cache_lock = threading.Lock()
+
+    def _cache_paths(self, url: str):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.pdf", self.cache_dir / f"{key}.json"
+
+    def _load_cache_metadata(self, file_path: Path, meta_path: Path) -> Optional[Dict[str, Any]]:
+        if not file_path.exists() or not meta_path.exists():
+            return None
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _check_out(self, file_path: Path) -> str:
+        """Link a cached file to a path of its own for one caller, copying it if links are unsupported"""
+        self.in_use_dir.mkdir(parents=True, exist_ok=True)
+        link_path = self.in_use_dir / f"{file_path.stem}-{uuid.uuid4().hex}.pdf"
+        try:
+            os.link(file_path, link_path)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            shutil.copyfile(file_path, link_path)
+        return str(link_path)
+
+    def release(self, file_path: str) -> None:
+        """Remove the file a download handed out"""
+        try:
+            os.unlink(file_path)
+        except FileNotFoundError:
+            pass
+
+    def download(self, url: str, progress: Optional[IngestionProgress] = None) -> str:
+        """
+        Download a URL into the local cache and return the path of a link to the
+        cached file that the caller owns and removes with release().
+        At most Settings.DOWNLOAD_MAX_CONCURRENT downloads run at once.
+
+        Args:
+            url: URL of the document
+            progress: Optional progress hooks, checked for cancellation between chunks
+
+        Raises:
+            DownloadTooLargeError: if the document exceeds Settings.DOWNLOAD_MAX_BYTES
+        """
+        progress = progress or IngestionProgress()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        file_path, meta_path = self._cache_paths(url)
+        cached = self._load_cache_metadata(file_path, meta_path)
+
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        timeout = (self.settings.DOWNLOAD_CONNECT_TIMEOUT, self.settings.DOWNLOAD_READ_TIMEOUT)
+        max_bytes = self.settings.DOWNLOAD_MAX_BYTES
+        # Bound concurrent downloads across all jobs sharing this service
+        with self._download_slots:
+            with self.session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 304 and cached:
+                    record_cache_lookup("download", True)
+                    logger.info("Cached copy of %s is up to date", url)
+                    with self._cache_lock:
+                        # Refresh the modification time so eviction treats it as recently used
+                        os.utime(file_path)
+                        return self._check_out(file_path)
+
+                response.raise_for_status()
+                record_cache_lookup("download", False)
+                content_length = response.headers.get("Content-Length")
+                if content_length and int(content_length) > max_bytes:
+                    raise DownloadTooLargeError(
+                        f"Document is {content_length} bytes, larger than the limit of {max_bytes} bytes"
+                    )
+
+                fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+                try:
+                    downloaded = 0
+                    with os.fdopen(fd, "wb") as f:
+                        for chunk in response.iter_content(chunk_size=self.settings.DOWNLOAD_CHUNK_BYTES):
+                            downloaded += len(chunk)
+                            if downloaded > max_bytes:
+                                raise DownloadTooLargeError(
+                                    f"Document exceeds the download limit of {max_bytes} bytes"
+                                )
+                            f.write(chunk)
+                            progress.check_cancelled()
+                    with self._cache_lock:
+                        os.replace(temp_path, file_path)
+                        checked_out = self._check_out(file_path)
+                except BaseException:
+                    if os.path.exists(temp_path):
+                        os.unlink(temp_path)
+                    raise
+
+                metadata = {
+                    "url": url,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "size": downloaded
+                }
+                write_json_atomic(meta_path, metadata)
+
+        logger.info("Downloaded %d bytes from %s", downloaded, url)
+        with self._cache_lock:
+            self._evict(keep=file_path)
+        return checked_out
+
+    def _evict(self, keep: Path) -> None:
+        """
+        Remove least recently used cache entries beyond Settings.DOWNLOAD_CACHE_MAX_BYTES.
+        Files handed out to callers stay readable through their own links.
+        """
+        entries = []
+        for file_path in self.cache_dir.glob("*.pdf"):
+            try:
+                stat = file_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file_path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, file_path in sorted(entries):
+            if total <= self.settings.DOWNLOAD_CACHE_MAX_BYTES:
+                break
+            if file_path == keep:
+                continue
+            for path in (file_path, file_path.with_suffix(".json")):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            total -= size
@@ -1,29 +1,97 @@
 from langchain.schema import Document
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Iterable, Iterator, Optional
 from config.settings import Settings
 from rank_bm25 import BM25Okapi # type: ignore
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
+from .bm25_encoder import BM25MatrixEncoder
+from .corpus_stats_service import CorpusStats, CorpusStatsAccumulator, CorpusStatsService
+from .rerank_service import RerankService
+from .ingestion_job_service import IngestionProgress
+from .metrics_service import cache_requests_total, metrics, span, tokens_total
+from collections import Counter, OrderedDict
+import logging
 import re
+import threading
+import zlib
+import hashlib
+
+logger = logging.getLogger(__name__)
+
+# After lowercasing and replacing special characters, text is runs of [a-z0-9]
+# separated by whitespace. On such text word_tokenize only splits on whitespace
+# and splits these contractions, so one regex pass gives the same tokens.
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+_CONTRACTIONS = {
+    "cannot": ("can", "not"),
+    "gimme": ("gim", "me"),
+    "gonna": ("gon", "na"),
+    "gotta": ("got", "ta"),
+    "lemme": ("lem", "me"),
+    "wanna": ("wan", "na"),
+}
 
 class EmbeddingService:
     def __init__(self, settings: Settings):
         self.settings = settings
-        # Download required NLTK data
-        try:
-            nltk.data.find('tokenizers/punkt')
-            nltk.data.find('corpora/stopwords')
-        except LookupError:
-            nltk.download('punkt')
-            nltk.download('stopwords')
+        # NLTK is imported and its data loaded on first use, see _load_nltk
+        self._word_tokenize = None
+        self._stop_words = None
+        self._nltk_lock = threading.Lock()
+        if settings.TOKENIZER_BACKEND not in ("fast", "nltk"):
+            raise ValueError(f"Unknown tokenizer backend: {settings.TOKENIZER_BACKEND}")
+        self._query_tokens: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+        self._query_tokens_lock = threading.Lock()
+        # Lookups are counted in plain ints under the cache lock and exported to
+        # rag_cache_requests_total when metrics are rendered, keeping the hit path cheap
+        self._query_token_hits = 0
+        self._query_token_misses = 0
+        self._query_token_exported = (0, 0)
+        metrics.add_collector(self._export_query_token_lookups)
         
         # Initialize BM25 model
         self.bm25 = None
         self.tokenized_corpus = []
-        self.vocabulary = {}
-        self.next_index = 0
-        self.stop_words = set(stopwords.words('english'))
+        self.matrix_encoder = BM25MatrixEncoder(
+            self._get_token_index,
+            k1=settings.BM25_K1,
+            b=settings.BM25_B
+        )
+        self.corpus_stats = CorpusStatsService(settings)
+        self.reranker = RerankService(settings, self.corpus_stats)
+
+    def _load_nltk(self) -> None:
+        """
+        Import NLTK and load the stopwords, and the tokenizer for the "nltk"
+        backend, downloading missing data
+        """
+        with self._nltk_lock:
+            if self._stop_words is not None:
+                return
+            import nltk
+            from nltk.tokenize import word_tokenize
+            from nltk.corpus import stopwords
+
+            # Download required NLTK data
+            required = [('corpora/stopwords', 'stopwords')]
+            if self.settings.TOKENIZER_BACKEND == "nltk":
+                required.append(('tokenizers/punkt', 'punkt'))
+            for path, package in required:
+                try:
+                    nltk.data.find(path)
+                except LookupError:
+                    nltk.download(package)
+
+            self._word_tokenize = word_tokenize
+            self._stop_words = set(stopwords.words('english'))
+
+    @property
+    def stop_words(self) -> set:
+        if self._stop_words is None:
+            self._load_nltk()
+        return self._stop_words
+
+    def warm_up(self) -> None:
+        """Load NLTK data ahead of the first request"""
+        self._load_nltk()
 
     def _preprocess_text(self, text: str) -> List[str]:
         """
@@ -32,7 +100,27 @@ class EmbeddingService:
         2. Removing special characters
         3. Removing stopwords
         4. Tokenizing
+
+        The tokenizer is selected by Settings.TOKENIZER_BACKEND ("fast" or "nltk").
         """
+        if self.settings.TOKENIZER_BACKEND == "fast":
+            return self._preprocess_text_fast(text)
+        return self._preprocess_text_nltk(text)
+
+    def _preprocess_text_fast(self, text: str) -> List[str]:
+        """Same tokens as _preprocess_text_nltk in a single regex pass"""
+        stop_words = self.stop_words
+        tokens = []
+        for token in _TOKEN_PATTERN.findall(text.lower()):
+            parts = _CONTRACTIONS.get(token)
+            if parts is None:
+                if token not in stop_words:
+                    tokens.append(token)
+            else:
+                tokens.extend(part for part in parts if part not in stop_words)
+        return tokens
+
+    def _preprocess_text_nltk(self, text: str) -> List[str]:
         # Convert to lowercase
         text = text.lower()
         
@@ -40,19 +128,50 @@ class EmbeddingService:
         text = re.sub(r'[^a-zA-Z0-9\s]', ' ', text)
         
         # Tokenize
-        tokens = word_tokenize(text)
+        stop_words = self.stop_words
+        tokens = self._word_tokenize(text)
         
         # Remove stopwords
-        tokens = [token for token in tokens if token not in self.stop_words]
+        tokens = [token for token in tokens if token not in stop_words]
         
         return tokens
 
-    def _get_or_create_index(self, token: str) -> int:
-        """Get or create an index for a token in the vocabulary"""
-        if token not in self.vocabulary:
-            self.vocabulary[token] = self.next_index
-            self.next_index += 1
-        return self.vocabulary[token]
+    def _preprocess_query(self, query: str) -> List[str]:
+        """Preprocess a query, reusing the tokens of recently seen query strings"""
+        max_entries = self.settings.QUERY_TOKEN_CACHE_MAX_ENTRIES
+        if max_entries <= 0:
+            return self._preprocess_text(query)
+        with self._query_tokens_lock:
+            cached = self._query_tokens.get(query)
+            if cached is not None:
+                self._query_tokens.move_to_end(query)
+                self._query_token_hits += 1
+                return list(cached)
+        tokens = self._preprocess_text(query)
+        with self._query_tokens_lock:
+            self._query_token_misses += 1
+            self._query_tokens[query] = tuple(tokens)
+            while len(self._query_tokens) > max_entries:
+                self._query_tokens.popitem(last=False)
+        return tokens
+
+    def _export_query_token_lookups(self) -> None:
+        """Add the query token cache lookups since the last export to rag_cache_requests_total"""
+        with self._query_tokens_lock:
+            hits, misses = self._query_token_hits, self._query_token_misses
+            exported_hits, exported_misses = self._query_token_exported
+            self._query_token_exported = (hits, misses)
+        cache_requests_total.inc(hits - exported_hits, cache="query_tokens", result="hit")
+        cache_requests_total.inc(misses - exported_misses, cache="query_tokens", result="miss")
+
+    def _get_token_index(self, token: str) -> int:
+        """
+        Map a token to its sparse vector index.
+
+        Uses a CRC32 feature hash, so every worker and both routers derive the same
+        index for a token without any shared state, and it survives restarts.
+        """
+        return zlib.crc32(token.encode("utf-8")) % self.settings.SPARSE_INDEX_SPACE
 
     def _convert_to_sparse_format(self, scores: List[float], tokens: List[str]) -> Dict[str, List]:
         """Convert BM25 scores to Pinecone's required sparse vector format"""
@@ -70,13 +189,13 @@ class EmbeddingService:
             normalized_score = (score + 1) / 2  # Shift and scale to [0,1] range
             
             if normalized_score > 0.1:  # Include scores above threshold
-                index = self._get_or_create_index(token)
+                index = self._get_token_index(token)
                 index_scores[index] = normalized_score
         
         # If no scores above threshold, use default scoring
         if not index_scores:
             for i, token in enumerate(tokens):
-                index = self._get_or_create_index(token)
+                index = self._get_token_index(token)
                 index_scores[index] = 1.0 / (i + 1)  # Decreasing weights
         
         # Convert to lists, ensuring indices are unique and sorted
@@ -92,74 +211,170 @@ class EmbeddingService:
         """
         Generate BM25 sparse embeddings for a list of texts
         Returns sparse vectors in Pinecone's required format: {'indices': List[int], 'values': List[float]}
+
+        The encoder is selected by Settings.SPARSE_ENCODER ("matrix" or "legacy").
         """
+        sparse_vectors, _, _ = self._encode_corpus(texts)
+        return sparse_vectors
+
+    def _encode_corpus(self, texts: List[str]) -> Tuple[List[Dict[str, List]], CorpusStats, List[List[str]]]:
+        """Encode texts as one corpus and return the sparse vectors with its statistics and tokens"""
         if not texts:
-            return []
+            return [], CorpusStats(0, 0.0, {}), []
+
+        if self.settings.SPARSE_ENCODER == "legacy":
+            sparse_vectors = self._get_sparse_embeddings_legacy(texts)
+            return sparse_vectors, CorpusStats.from_tokenized_corpus(self.tokenized_corpus), self.tokenized_corpus
+
+        logger.debug("Generating sparse embeddings for %d texts", len(texts))
+        with span("encode", texts=len(texts)):
+            tokenized_corpus = [self._preprocess_text(text) for text in texts]
+            sparse_vectors, stats = self.matrix_encoder.encode(tokenized_corpus)
+        tokens_total.inc(sum(map(len, tokenized_corpus)), kind="chunk")
+
+        if not any(vector["indices"] for vector in sparse_vectors):
+            logger.warning("No valid sparse vectors generated")
+
+        return sparse_vectors, stats, tokenized_corpus
+
+    def get_query_sparse_embedding(self, query: str, namespace: str) -> Dict[str, List]:
+        """
+        Encode a query against the persisted corpus statistics of a namespace.
+
+        Each query token is weighted by its corpus IDF (one dictionary lookup per
+        token); tokens that never occur in the namespace are dropped. Namespaces
+        ingested before statistics were persisted fall back to uniform weights.
+        """
+        return self.get_query_sparse_embeddings([query], [namespace])[0]
+
+    def get_query_sparse_embeddings(self, queries: List[str], namespaces: List[str]) -> List[Dict[str, List]]:
+        """
+        Encode queries, each against the corpus statistics of its namespace, in
+        one pass. Statistics are looked up once per namespace and repeated
+        queries are encoded once.
+        """
+        stats_by_namespace: Dict[str, Optional[CorpusStats]] = {}
+        for namespace in namespaces:
+            if namespace not in stats_by_namespace:
+                stats_by_namespace[namespace] = self.corpus_stats.get(namespace)
+                if stats_by_namespace[namespace] is None:
+                    logger.warning("No corpus statistics for namespace: %s, using uniform query weights", namespace)
+
+        encoded: Dict[Tuple[str, str], Dict[str, List]] = {}
+        for query, namespace in zip(queries, namespaces):
+            if (query, namespace) not in encoded:
+                encoded[(query, namespace)] = self._encode_query(query, stats_by_namespace[namespace])
+        return [encoded[(query, namespace)] for query, namespace in zip(queries, namespaces)]
+
+    def _encode_query(self, query: str, stats: Optional[CorpusStats]) -> Dict[str, List]:
+        index_weights: Dict[int, float] = {}
+        query_tokens = self._preprocess_query(query)
+        tokens_total.inc(len(query_tokens), kind="query")
+        for token in query_tokens:
+            weight = stats.idf.get(token) if stats is not None else 1.0
+            if weight is None:
+                continue
+            index = self._get_token_index(token)
+            index_weights[index] = index_weights.get(index, 0.0) + weight
+
+        indices = sorted(index_weights)
+        return {
+            "indices": indices,
+            "values": [index_weights[index] for index in indices]
+        }
 
-        print(f"Generating sparse embeddings for {len(texts)} texts")
+    def _get_sparse_embeddings_legacy(self, texts: List[str]) -> List[Dict[str, List]]:
+        """
+        Generate sparse embeddings by scoring every token against a BM25Okapi model.
+        Kept for output and speed comparison with the matrix encoder.
+        """
+        logger.debug("Generating sparse embeddings for %d texts", len(texts))
         
         # Preprocess all texts
         self.tokenized_corpus = [self._preprocess_text(text) for text in texts]
-        print(f"Tokenized corpus size: {len(self.tokenized_corpus)}")
+        logger.debug("Tokenized corpus size: %d", len(self.tokenized_corpus))
+        
+        if not any(self.tokenized_corpus):
+            # BM25Okapi cannot be built from a corpus without tokens
+            logger.warning("No valid sparse vectors generated")
+            return [{"indices": [], "values": []} for _ in texts]
         
         # Create BM25 model
         self.bm25 = BM25Okapi(self.tokenized_corpus)
         
-        # Get sparse vectors for each text
+        # Get one sparse vector per text, empty for texts without tokens, so
+        # vectors stay aligned with their chunks
         sparse_vectors = []
-        for text in texts:
-            # Preprocess query text
-            query_tokens = self._preprocess_text(text)
-            print(f"Query tokens: {query_tokens}")
+        for query_tokens in self.tokenized_corpus:
+            logger.debug("Query tokens: %s", query_tokens)
             
             if not query_tokens:
-                print("Warning: No tokens after preprocessing")
+                logger.warning("No tokens after preprocessing")
+                sparse_vectors.append({"indices": [], "values": []})
                 continue
                 
             # Convert to Pinecone's required format
             sparse_vector = self._convert_to_sparse_format([], query_tokens)
-            # print(f"Sparse vector: {sparse_vector}")
+            logger.debug("Sparse vector: %s", sparse_vector)
             
-            if sparse_vector["indices"]:  # Only add if we have valid indices
-                sparse_vectors.append(sparse_vector)
-            else:
-                print("Warning: No valid indices in sparse vector")
+            if not sparse_vector["indices"]:
+                logger.warning("No valid indices in sparse vector")
+            sparse_vectors.append(sparse_vector)
         
-        if not sparse_vectors:
-            print("Warning: No valid sparse vectors generated")
-            # Return a default sparse vector with a single token
-            return [{"indices": [0], "values": [1.0]}]
+        if not any(vector["indices"] for vector in sparse_vectors):
+            logger.warning("No valid sparse vectors generated")
             
         return sparse_vectors
 
-    def search(self, query: str, documents: List[Document], k: int = 30) -> List[Document]:
+    def search(self, query: str, documents: List[Document], k: int = 30, namespace: Optional[str] = None) -> List[Document]:
         """
-        Search documents using BM25 scoring
+        Rerank documents using BM25 scoring
+
+        With a namespace, documents are scored against the namespace's corpus
+        statistics and their term frequencies are read from the rerank cache,
+        so only chunks missing from it are tokenized. Without one, the documents
+        are scored as their own corpus. Returns copies of the top k documents with
+        a positive score; the input documents are left unchanged.
         """
-        # Preprocess all documents
-        doc_texts = [doc.page_content for doc in documents]
-        tokenized_docs = [self._preprocess_text(text) for text in doc_texts]
-        
-        # Create BM25 model
-        bm25 = BM25Okapi(tokenized_docs)
-        
-        # Preprocess query
-        query_tokens = self._preprocess_text(query)
-        
-        # Get document scores
-        doc_scores = bm25.get_scores(query_tokens)
-        
-        # Get top k documents
-        top_k_indices = sorted(range(len(doc_scores)), key=lambda i: doc_scores[i], reverse=True)[:k]
-        
-        # Create result documents with scores
-        results = []
-        for idx in top_k_indices:
-            if doc_scores[idx] > 0:  # Only include documents with positive scores
-                doc = documents[idx]
-                doc.metadata['score'] = float(doc_scores[idx])
-                results.append(doc)
-        
+        with span("rerank", candidates=len(documents)):
+            query_tokens = self._preprocess_query(query)
+
+            stats = self.corpus_stats.get(namespace) if namespace else None
+            term_frequencies = []
+            misses = 0
+            for doc in documents:
+                chunk_id = doc.metadata.get("id")
+                cached = self.reranker.get(namespace, chunk_id) if namespace and chunk_id else None
+                if cached is None:
+                    misses += 1
+                    tokens = self._preprocess_text(doc.page_content)
+                    if namespace and chunk_id:
+                        self.reranker.add(namespace, chunk_id, tokens)
+                    cached = (Counter(tokens), len(tokens))
+                term_frequencies.append(cached)
+            cache_requests_total.inc(len(documents) - misses, cache="rerank", result="hit")
+            cache_requests_total.inc(misses, cache="rerank", result="miss")
+
+            if stats is None:
+                stats = CorpusStats.from_term_frequencies(term_frequencies)
+
+            # Get document scores
+            doc_scores = self.reranker.score(query_tokens, term_frequencies, stats)
+
+            # Get top k documents
+            top_k_indices = sorted(range(len(doc_scores)), key=lambda i: doc_scores[i], reverse=True)[:k]
+
+            # Create result documents with scores
+            results = []
+            for idx in top_k_indices:
+                if doc_scores[idx] > 0:  # Only include documents with positive scores
+                    doc = documents[idx]
+                    metadata = dict(doc.metadata)
+                    if "score" in metadata:
+                        metadata["vector_score"] = metadata["score"]
+                    metadata["score"] = float(doc_scores[idx])
+                    results.append(Document(page_content=doc.page_content, metadata=metadata))
+
         return results
 
     def prepare_vectors_for_upload(
@@ -168,31 +383,94 @@ class EmbeddingService:
         namespace: str
     ) -> List[Dict[str, Any]]:
         """
-        Prepare documents for vector store upload by generating sparse embeddings
+        Prepare documents for vector store upload by generating sparse embeddings.
+        The corpus statistics of the documents are persisted for the namespace so
+        queries against it are encoded with the same IDF.
         """
-        print("embedding_service: Preparing vectors for upload...")
+        logger.info("Preparing vectors for upload...")
         texts = [doc.page_content for doc in documents]
         
         # Generate sparse embeddings
-        sparse_embeddings = self.get_sparse_embeddings(texts)
+        sparse_embeddings, stats, tokenized_corpus = self._encode_corpus(texts)
+        self.corpus_stats.save(namespace, stats)
         
         vectors = []
-        for i, (doc, sparse_emb) in enumerate(zip(documents, sparse_embeddings)):
-            # Ensure sparse_values is in the correct format
-            sparse_values = {
+        occurrences: Dict[str, int] = {}
+        for doc, sparse_emb, tokens in zip(documents, sparse_embeddings, tokenized_corpus):
+            vector_id = self._chunk_id(namespace, doc, occurrences)
+            if not sparse_emb["indices"]:
+                # Chunks without any tokens cannot be stored as sparse vectors
+                continue
+            self.reranker.add(namespace, vector_id, tokens)
+            vectors.append(self._build_vector(vector_id, doc, sparse_emb))
+            
+        return vectors
+
+    def iter_vectors_for_upload(
+        self,
+        chunk_windows: Iterable[List[Document]],
+        namespace: str,
+        progress: Optional[IngestionProgress] = None,
+        accumulator: Optional[CorpusStatsAccumulator] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily encode windows of chunks and yield vectors ready for upload.
+
+        Always uses the matrix encoder. Length normalization uses the running
+        average chunk length of the windows seen so far, and the namespace's
+        corpus statistics are persisted once the last window has been encoded.
+        Pass an accumulator to follow the running statistics while iterating.
+        """
+        progress = progress or IngestionProgress()
+        accumulator = accumulator if accumulator is not None else CorpusStatsAccumulator()
+        occurrences: Dict[str, int] = {}
+        for window in chunk_windows:
+            progress.set_stage("encode")
+            with span("encode", texts=len(window)):
+                tokenized_window = [self._preprocess_text(doc.page_content) for doc in window]
+                accumulator.add_documents(tokenized_window)
+                sparse_embeddings, doc_frequencies = self.matrix_encoder.encode_window(
+                    tokenized_window,
+                    accumulator.avg_doc_length
+                )
+                accumulator.add_doc_frequencies(doc_frequencies)
+            tokens_total.inc(sum(map(len, tokenized_window)), kind="chunk")
+            progress.add_encoded(len(window))
+
+            for doc, sparse_emb, tokens in zip(window, sparse_embeddings, tokenized_window):
+                vector_id = self._chunk_id(namespace, doc, occurrences)
+                if sparse_emb["indices"]:
+                    self.reranker.add(namespace, vector_id, tokens)
+                    yield self._build_vector(vector_id, doc, sparse_emb)
+
+        self.corpus_stats.save(namespace, accumulator.to_stats())
+
+    def _chunk_id(self, namespace: str, doc: Document, occurrences: Dict[str, int]) -> str:
+        """
+        Content-addressed chunk ID: a hash of the chunk's page and text, so an
+        unchanged chunk keeps its ID when the document is re-ingested. Identical
+        chunks on the same page get an occurrence suffix.
+        """
+        content = f"{doc.metadata.get('page')}\x00{doc.page_content}"
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+        count = occurrences.get(digest, 0)
+        occurrences[digest] = count + 1
+        return f"{namespace}#{digest}" if count == 0 else f"{namespace}#{digest}-{count}"
+
+    def _build_vector(self, vector_id: str, doc: Document, sparse_emb: Dict[str, List]) -> Dict[str, Any]:
+        """Build a vector store record for a chunk"""
+        metadata = {
+            "text": doc.page_content,
+            "page": doc.metadata.get("page", None),
+            "page_label": doc.metadata.get("page_label", None),
+        }
+        if doc.metadata.get("start_index") is not None:
+            metadata["start_index"] = doc.metadata["start_index"]
+        return {
+            "id": vector_id,
+            "sparse_values": {
                 "indices": sparse_emb["indices"],
                 "values": sparse_emb["values"]
-            }
-            
-            vector = {
-                "id": f"{namespace}#chunk{i+1}",
-                "sparse_values": sparse_values,  # Use the properly formatted sparse_values
-                "metadata": {
-                    "text": doc.page_content,
-                    "page": doc.metadata.get("page", None),
-                    "page_label": doc.metadata.get("page_label", None),
-                }
-            }
-            vectors.append(vector)
-            
-        return vectors 
\ No newline at end of file
+            },
+            "metadata": metadata
+        }
@@ -0,0 +1,357 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+import logging
+import queue
+import threading
+import time
+import uuid
+from config.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+class IngestionCancelledError(Exception):
+    """Raised inside an ingestion pipeline when its job has been cancelled"""
+
+class IngestionQueueFullError(Exception):
+    """Raised when the ingestion queue cannot accept another job"""
+
+class IngestionProgress:
+    """
+    Progress hooks called by the ingestion pipeline. The base class does nothing,
+    so the pipeline can run without a job attached.
+    """
+
+    def set_stage(self, stage: str) -> None:
+        pass
+
+    def add_chunks(self, count: int) -> None:
+        pass
+
+    def add_encoded(self, count: int) -> None:
+        pass
+
+    def add_upserted(self, count: int) -> None:
+        pass
+
+    def check_cancelled(self) -> None:
+        pass
+
+class IngestionJob(IngestionProgress):
+    """State and progress of a single background ingestion job"""
+
+    def __init__(
+        self,
+        namespace: str,
+        source: Optional[str],
+        task: Callable[["IngestionJob"], Any],
+        prepare: Optional[Callable[["IngestionJob"], Any]] = None,
+        batch_id: Optional[str] = None,
+        cleanup: Optional[Callable[[], Any]] = None
+    ):
+        self.id = uuid.uuid4().hex
+        self.namespace = namespace
+        self.source = source
+        self.task = task
+        self.prepare = prepare
+        # Result of prepare, e.g. the path of the downloaded document, for the task to use
+        self.prepared: Any = None
+        self.batch_id = batch_id
+        # Runs once when the job finishes, however it finishes, e.g. to remove an uploaded file
+        self.cleanup = cleanup
+        self.status = "queued"
+        self.stage = "queued"
+        self.error: Optional[str] = None
+        self.chunks_total = 0
+        self.chunks_encoded = 0
+        self.vectors_upserted = 0
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._started_monotonic: Optional[float] = None
+        self._finished_monotonic: Optional[float] = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def set_stage(self, stage: str) -> None:
+        self.stage = stage
+
+    def add_chunks(self, count: int) -> None:
+        with self._lock:
+            self.chunks_total += count
+
+    def add_encoded(self, count: int) -> None:
+        with self._lock:
+            self.chunks_encoded += count
+
+    def add_upserted(self, count: int) -> None:
+        with self._lock:
+            self.vectors_upserted += count
+
+    def check_cancelled(self) -> None:
+        if self._cancel_event.is_set():
+            raise IngestionCancelledError(f"Ingestion job {self.id} was cancelled")
+
+    def cancel(self) -> None:
+        self._cancel_event.set()
+
+    def mark_running(self) -> None:
+        self.status = "running"
+        self.started_at = datetime.utcnow()
+        self._started_monotonic = time.monotonic()
+
+    def mark_finished(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        self.stage = "done" if status == "succeeded" else self.stage
+        self.error = error
+        self.finished_at = datetime.utcnow()
+        self._finished_monotonic = time.monotonic()
+        with self._lock:
+            cleanup, self.cleanup = self.cleanup, None
+        if cleanup is not None:
+            try:
+                cleanup()
+            except Exception:
+                logger.exception("Cleanup of job %s failed", self.id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Snapshot of the job for API responses"""
+        elapsed = None
+        throughput = None
+        if self._started_monotonic is not None:
+            end = self._finished_monotonic if self._finished_monotonic is not None else time.monotonic()
+            elapsed = end - self._started_monotonic
+            throughput = self.vectors_upserted / elapsed if elapsed > 0 else 0.0
+
+        return {
+            "job_id": self.id,
+            "batch_id": self.batch_id,
+            "namespace": self.namespace,
+            "source": self.source,
+            "status": self.status,
+            "stage": self.stage,
+            "chunks_total": self.chunks_total,
+            "chunks_encoded": self.chunks_encoded,
+            "vectors_upserted": self.vectors_upserted,
+            "elapsed_seconds": elapsed,
+            "vectors_per_second": throughput,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class JobSpec(NamedTuple):
+    """An ingestion job to submit, see IngestionJobService.submit"""
+    namespace: str
+    source: Optional[str]
+    task: Callable[[IngestionJob], Any]
+    prepare: Optional[Callable[[IngestionJob], Any]] = None
+    cleanup: Optional[Callable[[], Any]] = None
+
+class IngestionJobService:
+    """
+    Runs document ingestion in a pool of background worker threads, so upload
+    requests return immediately with a job id.
+
+    Jobs with a prepare step (downloading the document) first go to a separate
+    pool of Settings.DOWNLOAD_MAX_CONCURRENT threads, so downloads for queued
+    jobs run while the workers parse, encode and upsert earlier ones. At most
+    one prepared document per worker and download thread is kept waiting.
+
+    Jobs are tracked in memory per process; finished jobs are kept up to
+    Settings.INGESTION_JOB_HISTORY entries.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        # Accepted jobs are bounded by the _queued count, so the queues need no limit
+        self._queue: "queue.Queue[IngestionJob]" = queue.Queue()
+        self._prepare_queue: "queue.Queue[IngestionJob]" = queue.Queue()
+        self._queued = 0
+        self._queued_lock = threading.Lock()
+        self._prepare_threads = max(1, settings.DOWNLOAD_MAX_CONCURRENT)
+        self._prepared_slots = threading.BoundedSemaphore(settings.INGESTION_WORKERS + self._prepare_threads)
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._workers = []
+        self._workers_lock = threading.Lock()
+
+    def _ensure_workers(self) -> None:
+        """Start the worker threads on first use"""
+        with self._workers_lock:
+            if self._workers:
+                return
+            for i in range(self.settings.INGESTION_WORKERS):
+                worker = threading.Thread(target=self._worker_loop, name=f"ingestion-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            for i in range(self._prepare_threads):
+                worker = threading.Thread(target=self._prepare_loop, name=f"ingestion-prepare-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _worker_loop(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                self._dequeued()
+                self._run_job(job)
+            finally:
+                self._queue.task_done()
+
+    def _prepare_loop(self) -> None:
+        while True:
+            job = self._prepare_queue.get()
+            try:
+                self._prepare_job(job)
+            finally:
+                self._prepare_queue.task_done()
+
+    def _dequeued(self) -> None:
+        with self._queued_lock:
+            self._queued -= 1
+
+    def _run_step(self, job: IngestionJob, step: Callable[[IngestionJob], Any]) -> bool:
+        """Run a step of a job; if it fails or is cancelled, finish the job and return False"""
+        try:
+            job.check_cancelled()
+            step(job)
+            return True
+        except IngestionCancelledError:
+            job.mark_finished("cancelled")
+        except Exception as e:
+            logger.exception("Job %s failed", job.id)
+            job.mark_finished("failed", str(e))
+        logger.info("Job %s finished with status: %s", job.id, job.status)
+        return False
+
+    def _prepare_job(self, job: IngestionJob) -> None:
+        if job.finished:
+            # Cancelled while still queued
+            self._dequeued()
+            return
+
+        # Wait until the workers have room for another prepared document
+        self._prepared_slots.acquire()
+        if job.finished:
+            self._dequeued()
+            self._prepared_slots.release()
+            return
+        job.mark_running()
+        logger.info("Preparing job %s for namespace: %s", job.id, job.namespace)
+
+        def prepare(job: IngestionJob) -> None:
+            job.prepared = job.prepare(job)
+
+        if self._run_step(job, prepare):
+            self._queue.put(job)
+        else:
+            self._dequeued()
+            self._prepared_slots.release()
+
+    def _run_job(self, job: IngestionJob) -> None:
+        try:
+            if job.finished:
+                # Cancelled while still queued
+                return
+
+            if job.status == "queued":
+                job.mark_running()
+            logger.info("Starting job %s for namespace: %s", job.id, job.namespace)
+            if self._run_step(job, job.task):
+                job.mark_finished("succeeded")
+                logger.info("Job %s finished with status: %s", job.id, job.status)
+        finally:
+            if job.prepare is not None:
+                self._prepared_slots.release()
+
+    def _remember(self, job: IngestionJob) -> None:
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+            # Evict the oldest finished jobs beyond the history limit
+            excess = len(self._jobs) - self.settings.INGESTION_JOB_HISTORY
+            for job_id in list(self._jobs):
+                if excess <= 0:
+                    break
+                if self._jobs[job_id].finished:
+                    del self._jobs[job_id]
+                    excess -= 1
+
+    def _admit(self, jobs: List[IngestionJob]) -> None:
+        """Queue jobs if all of them fit within Settings.INGESTION_QUEUE_SIZE"""
+        self._ensure_workers()
+        with self._queued_lock:
+            if self._queued + len(jobs) > self.settings.INGESTION_QUEUE_SIZE:
+                raise IngestionQueueFullError(
+                    f"Ingestion queue is full ({self.settings.INGESTION_QUEUE_SIZE} jobs), please retry later"
+                )
+            self._queued += len(jobs)
+        for job in jobs:
+            self._remember(job)
+            if job.prepare is not None:
+                self._prepare_queue.put(job)
+            else:
+                self._queue.put(job)
+
+    def submit(
+        self,
+        namespace: str,
+        source: Optional[str],
+        task: Callable[[IngestionJob], Any],
+        prepare: Optional[Callable[[IngestionJob], Any]] = None,
+        cleanup: Optional[Callable[[], Any]] = None
+    ) -> IngestionJob:
+        """
+        Queue an ingestion task. The task receives the job and reports progress
+        through its IngestionProgress hooks. An optional prepare step runs first on
+        the download threads, and its result is available to the task as job.prepared.
+        An optional cleanup runs once the job has finished, including when it is
+        cancelled before it starts.
+
+        Raises:
+            IngestionQueueFullError: if the queue is full
+        """
+        job = IngestionJob(namespace, source, task, prepare, cleanup=cleanup)
+        self._admit([job])
+        return job
+
+    def submit_batch(self, specs: List[JobSpec]) -> List[IngestionJob]:
+        """
+        Queue several ingestion tasks as one batch, all or none of them. The jobs
+        share a batch id and run concurrently within the worker limits.
+
+        Raises:
+            IngestionQueueFullError: if the queue cannot take the whole batch
+        """
+        batch_id = uuid.uuid4().hex
+        jobs = [IngestionJob(spec.namespace, spec.source, spec.task, spec.prepare, batch_id, spec.cleanup) for spec in specs]
+        self._admit(jobs)
+        return jobs
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        """Get a job by id"""
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def get_batch(self, batch_id: str) -> List[IngestionJob]:
+        """Get the jobs of a batch that are still in the job history"""
+        with self._jobs_lock:
+            return [job for job in self._jobs.values() if job.batch_id == batch_id]
+
+    def cancel(self, job_id: str) -> Optional[IngestionJob]:
+        """
+        Cancel a job. Queued jobs are cancelled immediately; running jobs stop at
+        the next stage or batch boundary.
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.cancel()
+        if job.status == "queued":
+            job.mark_finished("cancelled")
+        return job
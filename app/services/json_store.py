@@ -0,0 +1,21 @@
+from typing import Any
+from pathlib import Path
+import json
+import os
+import tempfile
+
+def write_json_atomic(path: Path, data: Any) -> None:
+    """
+    Write JSON to a file by replacing it atomically, so concurrent readers in
+    other threads or workers never see a partially written file
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
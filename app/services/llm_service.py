@@ -1,18 +1,36 @@
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import Runnable, RunnablePassthrough
+from langchain_core.language_models import BaseChatModel
 from langchain.schema import Document
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any, Optional, Union
 from config.settings import Settings
+from .answer_cache_service import AnswerCacheService
+from .context_service import ContextPackerService, PackedContext
+from .metrics_service import span, tokens_total
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the prompt changes, so cached answers from the old prompt are not reused
+PROMPT_VERSION = "2"
 
 class LLMService:
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, llm: Optional[BaseChatModel] = None):
+        """
+        Args:
+            settings: Application settings
+            llm: Optional chat model; defaults to ChatOpenAI with the configured model,
+                created on first use
+        """
         self.settings = settings
-        self.llm = ChatOpenAI(
-            model_name=settings.LLM_MODEL,
-            temperature=settings.LLM_TEMPERATURE
-        )
+        self.answer_cache = AnswerCacheService(settings)
+        self.context_packer = ContextPackerService(settings)
+        self._llm = llm
+        self._chain = None
+        self._outer_chain = None
+        self._chain_lock = threading.Lock()
         
         # Define prompt template using ChatPromptTemplate
         self.prompt = ChatPromptTemplate.from_messages([
@@ -45,40 +63,214 @@ Question: {question}
 Please provide a comprehensive analysis based on the context above.""")
         ])
         
-        # Create chain using LCEL
-        self.chain = (
-            self.prompt 
-            | self.llm 
-            | StrOutputParser()
+    def _build_chain(self) -> None:
+        """Create the LLM client and the chains on first use"""
+        with self._chain_lock:
+            if self._outer_chain is not None:
+                return
+            if self._llm is None:
+                from langchain_openai import ChatOpenAI
+                self._llm = ChatOpenAI(
+                    model_name=self.settings.LLM_MODEL,
+                    temperature=self.settings.LLM_TEMPERATURE
+                )
+
+            # Create chain using LCEL
+            self._chain = (
+                self.prompt 
+                | self._llm 
+                | StrOutputParser()
+            )
+            
+            # Wrap chain to include input in output
+            self._outer_chain = RunnablePassthrough().assign(text=self._chain)
+
+    @property
+    def llm(self) -> BaseChatModel:
+        if self._outer_chain is None:
+            self._build_chain()
+        return self._llm
+
+    @property
+    def chain(self) -> Runnable:
+        if self._outer_chain is None:
+            self._build_chain()
+        return self._chain
+
+    @property
+    def outer_chain(self) -> Runnable:
+        if self._outer_chain is None:
+            self._build_chain()
+        return self._outer_chain
+
+    def warm_up(self) -> None:
+        """Create the LLM client and load the token encoding ahead of the first request"""
+        self._build_chain()
+        self.context_packer.count_tokens("")
+
+    def get_sources(self, documents: List[Document]) -> List[Dict[str, Any]]:
+        """
+        Format sources with required fields
+        """
+        return [
+            {
+                "page": doc.metadata.get("page", "N/A"),
+                "id": doc.metadata.get("id", "N/A")  # Get ID from metadata
+            }
+            for doc in documents
+        ]
+
+    def _answer_cache_key(self, query: str, sources: List[Dict[str, Any]], context: str) -> str:
+        """
+        Reuse the answer if the same question already retrieved the same chunks
+        and they were packed into the same context
+        """
+        return self.answer_cache.key(
+            query,
+            [str(source["id"]) for source in sources],
+            context,
+            self.settings.LLM_MODEL,
+            self.settings.LLM_TEMPERATURE,
+            PROMPT_VERSION
         )
-        
-        # Wrap chain to include input in output
-        self.outer_chain = RunnablePassthrough().assign(text=self.chain)
+
+    def pack_context(self, documents: List[Document]) -> PackedContext:
+        """
+        Merge overlapping chunks and fit them into the context token budget
+        """
+        with span("context", documents=len(documents)):
+            packed = self.context_packer.pack(documents)
+        tokens_total.inc(packed.tokens, kind="context")
+        tokens_total.inc(packed.tokens_saved, kind="context_saved")
+        return packed
 
     def get_structured_answer(self, query: str, documents: List[Document]) -> Dict[str, Any]:
         """
         Get a structured answer with sources from the LLM
         """
-        print("llm_service: Getting structured answer...")
+        logger.debug("Getting structured answer...")
         # Prepare context from documents
-        context = "\n\n".join([doc.page_content for doc in documents])
-        sources = []
-        
-        # Format sources with required fields
-        for doc in documents:
-            source = {
-                "page": doc.metadata.get("page", "N/A"),
-                "id": doc.metadata.get("id", "N/A")  # Get ID from metadata
+        packed = self.pack_context(documents)
+        sources = self.get_sources(packed.documents)
+
+        cache_key = self._answer_cache_key(query, sources, packed.context)
+        answer = self.answer_cache.get(cache_key)
+        if answer is not None:
+            logger.debug("Answer served from cache")
+            return {
+                "answer": answer,
+                "sources": sources,
+                "context_tokens": packed.tokens,
+                "context_tokens_saved": packed.tokens_saved
             }
-            sources.append(source)
 
         # Run the chain
-        response = self.outer_chain.invoke({
-            "question": query,
-            "context": context,
-        })
+        with span("llm"):
+            response = self.outer_chain.invoke({
+                "question": query,
+                "context": packed.context,
+            })
+        self.answer_cache.set(cache_key, response["text"])
 
         return {
             "answer": response["text"],
-            "sources": sources
-        } 
\ No newline at end of file
+            "sources": sources,
+            "context_tokens": packed.tokens,
+            "context_tokens_saved": packed.tokens_saved
+        }
+
+    async def aget_structured_answer(self, query: str, documents: List[Document]) -> Dict[str, Any]:
+        """
+        Async counterpart of get_structured_answer; awaits the chain with ainvoke
+        """
+        logger.debug("Getting structured answer...")
+        packed = self.pack_context(documents)
+        sources = self.get_sources(packed.documents)
+
+        cache_key = self._answer_cache_key(query, sources, packed.context)
+        answer = self.answer_cache.get(cache_key)
+        if answer is None:
+            with span("llm"):
+                response = await self.outer_chain.ainvoke({
+                    "question": query,
+                    "context": packed.context,
+                })
+            answer = response["text"]
+            self.answer_cache.set(cache_key, answer)
+        else:
+            logger.debug("Answer served from cache")
+
+        return {
+            "answer": answer,
+            "sources": sources,
+            "context_tokens": packed.tokens,
+            "context_tokens_saved": packed.tokens_saved
+        }
+
+    def get_structured_answers(
+        self,
+        queries: List[str],
+        documents_list: List[List[Document]]
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Get structured answers for several questions. Cached answers are reused and
+        the remaining questions run through the chain concurrently, at most
+        Settings.LLM_MAX_CONCURRENCY at a time.
+
+        Returns the answer of each question, or the exception its LLM call raised.
+        """
+        logger.debug("Getting %d structured answers...", len(queries))
+        results: List[Union[Dict[str, Any], Exception]] = [None] * len(queries)
+        misses = []
+        for i, (query, documents) in enumerate(zip(queries, documents_list)):
+            packed = self.pack_context(documents)
+            sources = self.get_sources(packed.documents)
+            result = {
+                "sources": sources,
+                "context_tokens": packed.tokens,
+                "context_tokens_saved": packed.tokens_saved
+            }
+            cache_key = self._answer_cache_key(query, sources, packed.context)
+            answer = self.answer_cache.get(cache_key)
+            if answer is not None:
+                results[i] = {"answer": answer, **result}
+            else:
+                misses.append((i, cache_key, result, {"question": query, "context": packed.context}))
+
+        if misses:
+            with span("llm_batch", questions=len(misses)):
+                answers = self.chain.batch(
+                    [inputs for _, _, _, inputs in misses],
+                    config={"max_concurrency": max(1, self.settings.LLM_MAX_CONCURRENCY)},
+                    return_exceptions=True
+                )
+            for (i, cache_key, result, _), answer in zip(misses, answers):
+                if isinstance(answer, Exception):
+                    results[i] = answer
+                    continue
+                self.answer_cache.set(cache_key, answer)
+                results[i] = {"answer": answer, **result}
+        return results
+
+    async def stream_answer(self, query: str, packed: PackedContext) -> AsyncIterator[str]:
+        """
+        Stream the answer for a packed context token by token. A cached answer is
+        yielded as a single chunk, and a fully streamed answer is added to the cache.
+        """
+        logger.debug("Streaming answer...")
+        cache_key = self._answer_cache_key(query, self.get_sources(packed.documents), packed.context)
+        answer = self.answer_cache.get(cache_key)
+        if answer is not None:
+            logger.debug("Answer served from cache")
+            yield answer
+            return
+
+        parts = []
+        with span("llm_stream"):
+            async for token in self.chain.astream({
+                "question": query,
+                "context": packed.context,
+            }):
+                parts.append(token)
+                yield token
+        self.answer_cache.set(cache_key, "".join(parts))
@@ -0,0 +1,254 @@
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote, unquote
+import json
+import logging
+import os
+import tempfile
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rebuild a namespace's postings once this share of its rows are deleted or overwritten
+COMPACT_TOMBSTONE_RATIO = 0.5
+
+class Match:
+    def __init__(self, id: str, score: float, metadata: Dict[str, Any]):
+        self.id = id
+        self.score = score
+        self.metadata = metadata
+
+class QueryResponse:
+    def __init__(self, matches: List[Match]):
+        self.matches = matches
+
+class _Namespace:
+    """
+    Inverted index of one namespace. Rows are append-only; overwriting or
+    deleting a vector tombstones its row until the namespace is compacted.
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.alive = array("b")
+        self.rows_by_id: Dict[str, int] = {}
+        # token index -> (row numbers, weights)
+        self.postings: Dict[int, tuple] = {}
+        self.tombstones = 0
+
+    def __len__(self) -> int:
+        return len(self.rows_by_id)
+
+    def add(self, vector_id: str, indices: List[int], values: List[float], metadata: Dict[str, Any]) -> None:
+        self.remove(vector_id)
+        row = len(self.ids)
+        self.ids.append(vector_id)
+        self.metadata.append(metadata)
+        self.alive.append(1)
+        self.rows_by_id[vector_id] = row
+        for index, value in zip(indices, values):
+            posting = self.postings.get(index)
+            if posting is None:
+                posting = self.postings[index] = (array("i"), array("f"))
+            posting[0].append(row)
+            posting[1].append(value)
+
+    def remove(self, vector_id: str) -> None:
+        row = self.rows_by_id.pop(vector_id, None)
+        if row is not None:
+            self.alive[row] = 0
+            self.metadata[row] = {}
+            self.tombstones += 1
+
+    def should_compact(self) -> bool:
+        return self.tombstones > 0 and self.tombstones >= COMPACT_TOMBSTONE_RATIO * len(self.ids)
+
+    def compacted(self) -> "_Namespace":
+        """Copy of the namespace without tombstoned rows"""
+        new_rows = np.full(len(self.ids), -1, dtype=np.int64)
+        live_rows = np.flatnonzero(np.frombuffer(self.alive, dtype=np.int8))
+        new_rows[live_rows] = np.arange(len(live_rows))
+
+        compacted = _Namespace()
+        compacted.ids = [self.ids[row] for row in live_rows]
+        compacted.metadata = [self.metadata[row] for row in live_rows]
+        compacted.alive = array("b", [1] * len(live_rows))
+        compacted.rows_by_id = {vector_id: row for row, vector_id in enumerate(compacted.ids)}
+        for index, (rows, values) in self.postings.items():
+            mapped = new_rows[np.frombuffer(rows, dtype=np.int32)]
+            keep = mapped >= 0
+            if keep.any():
+                compacted.postings[index] = (
+                    array("i", mapped[keep].astype(np.int32).tobytes()),
+                    array("f", np.frombuffer(values, dtype=np.float32)[keep].tobytes())
+                )
+        return compacted
+
+    def search(self, indices: List[int], values: List[float], top_k: int) -> List[tuple]:
+        """Return (row, score) pairs of the top_k live rows by sparse dot product"""
+        row_parts = []
+        weight_parts = []
+        for index, query_weight in zip(indices, values):
+            posting = self.postings.get(index)
+            if posting is None:
+                continue
+            row_parts.append(np.frombuffer(posting[0], dtype=np.int32))
+            weight_parts.append(np.frombuffer(posting[1], dtype=np.float32) * query_weight)
+        if not row_parts:
+            return []
+
+        scores = np.bincount(
+            np.concatenate(row_parts),
+            weights=np.concatenate(weight_parts),
+            minlength=len(self.ids)
+        )
+        scores[np.frombuffer(self.alive, dtype=np.int8) == 0] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(row), float(scores[row])) for row in candidates]
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Serialize the live rows as CSR-style posting arrays"""
+        namespace = self.compacted() if self.tombstones else self
+        keys = np.array(sorted(namespace.postings), dtype=np.uint64)
+        lengths = [len(namespace.postings[int(key)][0]) for key in keys]
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+        rows = b"".join(namespace.postings[int(key)][0].tobytes() for key in keys)
+        values = b"".join(namespace.postings[int(key)][1].tobytes() for key in keys)
+        records = json.dumps({"ids": namespace.ids, "metadata": namespace.metadata})
+        return {
+            "keys": keys,
+            "offsets": offsets,
+            "rows": np.frombuffer(rows, dtype=np.int32),
+            "values": np.frombuffer(values, dtype=np.float32),
+            "records": np.frombuffer(records.encode("utf-8"), dtype=np.uint8)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "_Namespace":
+        records = json.loads(arrays["records"].tobytes().decode("utf-8"))
+        namespace = cls()
+        namespace.ids = records["ids"]
+        namespace.metadata = records["metadata"]
+        namespace.alive = array("b", [1] * len(namespace.ids))
+        namespace.rows_by_id = {vector_id: row for row, vector_id in enumerate(namespace.ids)}
+        offsets = arrays["offsets"]
+        for i, key in enumerate(arrays["keys"]):
+            start, end = offsets[i], offsets[i + 1]
+            namespace.postings[int(key)] = (
+                array("i", arrays["rows"][start:end].tobytes()),
+                array("f", arrays["values"][start:end].tobytes())
+            )
+        return namespace
+
+class LocalSparseIndex:
+    """
+    In-process sparse vector index implementing the subset of the Pinecone
+    Index API used by VectorStoreService: upsert, query, delete and
+    describe_index_stats, with namespaces.
+
+    Each namespace is an inverted index from token index to posting arrays of
+    (row, weight), and a query scores rows with a sparse dot product. When
+    snapshot_dir is set, namespaces are loaded from it on start and changed
+    namespaces are written back by flush().
+    """
+
+    def __init__(self, snapshot_dir: Optional[str] = None):
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else None
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._dirty = set()
+        self._lock = threading.RLock()
+        if self.snapshot_dir is not None:
+            self._load()
+
+    def _snapshot_path(self, namespace: str) -> Path:
+        return self.snapshot_dir / f"{quote(namespace, safe='')}.npz"
+
+    def _load(self) -> None:
+        if not self.snapshot_dir.is_dir():
+            return
+        for path in self.snapshot_dir.glob("*.npz"):
+            with np.load(path) as arrays:
+                self._namespaces[unquote(path.stem)] = _Namespace.from_arrays(arrays)
+        logger.info("Loaded %d namespaces from %s", len(self._namespaces), self.snapshot_dir)
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = "", **kwargs) -> Dict[str, int]:
+        with self._lock:
+            records = self._namespaces.setdefault(namespace, _Namespace())
+            for vector in vectors:
+                sparse = vector["sparse_values"]
+                records.add(vector["id"], sparse["indices"], sparse["values"], vector.get("metadata", {}))
+            if records.should_compact():
+                self._namespaces[namespace] = records.compacted()
+            self._dirty.add(namespace)
+        return {"upserted_count": len(vectors)}
+
+    def query(self, sparse_vector: Dict[str, List], top_k: int, namespace: str = "",
+              include_metadata: bool = False, vector: Any = None, **kwargs) -> QueryResponse:
+        with self._lock:
+            records = self._namespaces.get(namespace)
+            if records is None or top_k <= 0:
+                return QueryResponse([])
+            hits = records.search(sparse_vector["indices"], sparse_vector["values"], top_k)
+            return QueryResponse([
+                Match(records.ids[row], score, dict(records.metadata[row]) if include_metadata else {})
+                for row, score in hits
+            ])
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False, namespace: str = "", **kwargs) -> Dict:
+        with self._lock:
+            if delete_all:
+                self._namespaces.pop(namespace, None)
+            else:
+                records = self._namespaces.get(namespace)
+                if records is None:
+                    return {}
+                for vector_id in ids or []:
+                    records.remove(vector_id)
+                if records.should_compact():
+                    self._namespaces[namespace] = records.compacted()
+            self._dirty.add(namespace)
+        return {}
+
+    def describe_index_stats(self, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            namespaces = {
+                name: {"vector_count": len(records)}
+                for name, records in self._namespaces.items() if len(records)
+            }
+        return {
+            "namespaces": namespaces,
+            "total_vector_count": sum(ns["vector_count"] for ns in namespaces.values())
+        }
+
+    def flush(self) -> None:
+        """Write the snapshots of namespaces changed since the last flush"""
+        if self.snapshot_dir is None:
+            return
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            for namespace in dirty:
+                path = self._snapshot_path(namespace)
+                records = self._namespaces.get(namespace)
+                if records is None or not len(records):
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+                    continue
+                path.parent.mkdir(parents=True, exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        np.savez(f, **records.to_arrays())
+                    os.replace(temp_path, path)
+                except BaseException:
+                    if os.path.exists(temp_path):
+                        os.unlink(temp_path)
+                    raise
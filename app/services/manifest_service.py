@@ -0,0 +1,68 @@
+from datetime import datetime
+from typing import Iterable, Optional, Set, Tuple
+from pathlib import Path
+from urllib.parse import quote
+import json
+import os
+from config.settings import Settings
+from .json_store import write_json_atomic
+
+class ManifestService:
+    """
+    Keeps a manifest of the chunk IDs stored in each namespace, so re-ingesting a
+    document only upserts new or changed chunks and deletes removed ones
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.manifest_dir = Path(settings.MANIFEST_DIR)
+
+    def _path(self, namespace: str) -> Path:
+        return self.manifest_dir / f"{quote(namespace, safe='')}.json"
+
+    def get(self, namespace: str) -> Optional[Set[str]]:
+        """Get the chunk IDs of a namespace, or None if it has no manifest"""
+        try:
+            with open(self._path(namespace)) as f:
+                return set(json.load(f)["ids"])
+        except FileNotFoundError:
+            return None
+
+    def avg_doc_length(self, namespace: str) -> Optional[float]:
+        """
+        Get the average chunk length the stored chunks of a namespace were encoded
+        with, or None if it has no manifest or the manifest does not record it
+        """
+        try:
+            with open(self._path(namespace)) as f:
+                return json.load(f).get("avg_doc_length")
+        except FileNotFoundError:
+            return None
+
+    def version(self, namespace: str) -> Optional[Tuple[int, int, int]]:
+        """
+        Identify the current manifest of a namespace by its file's inode, size and
+        modification time, or None if it has none. Every save replaces the file,
+        so the version changes in every worker that shares the manifest directory.
+        """
+        try:
+            stat = os.stat(self._path(namespace))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def save(self, namespace: str, ids: Iterable[str], avg_doc_length: Optional[float] = None) -> None:
+        """Replace the manifest of a namespace"""
+        write_json_atomic(self._path(namespace), {
+            "namespace": namespace,
+            "updated_at": datetime.utcnow().isoformat(),
+            "avg_doc_length": avg_doc_length,
+            "ids": sorted(ids)
+        })
+
+    def delete(self, namespace: str) -> None:
+        """Remove the manifest of a namespace"""
+        try:
+            os.unlink(self._path(namespace))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,208 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple, Union
+import bisect
+import logging
+import math
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from sub-millisecond reranks to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if len(labels) != len(self.labelnames) or any(name not in labels for name in self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+class Counter(_Metric):
+    """Monotonic counter, one series per combination of label values"""
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = self._header()
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+class Histogram(_Metric):
+    """Histogram with fixed buckets, one series per combination of label values"""
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per series: observations per bucket (the last one above every bound), sum and count
+        self._series: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bucket] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels: Any) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series is not None else 0
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        lines = self._header()
+        for key, (counts, total, count) in series:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Counters and histograms of one process, rendered in the Prometheus text
+    exposition format. Each API worker has its own registry, so a scraper
+    should scrape every worker.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Union[Counter, Histogram]] = {}
+        self._collectors: List[weakref.WeakMethod] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, metric_class) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, callback: Callable[[], None]) -> None:
+        """
+        Call a bound method before every render, e.g. to export counts that a
+        hot path keeps in plain ints. The method's object is referenced weakly.
+        """
+        with self._lock:
+            self._collectors.append(weakref.WeakMethod(callback))
+
+    def render(self) -> str:
+        with self._lock:
+            self._collectors = [ref for ref in self._collectors if ref() is not None]
+            collectors = list(self._collectors)
+        for ref in collectors:
+            callback = ref()
+            if callback is not None:
+                callback()
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = [line for metric in metrics for line in metric.collect()]
+        return "\n".join(lines) + "\n"
+
+# Shared by every service in the process
+metrics = MetricsRegistry()
+
+stage_seconds = metrics.histogram(
+    "rag_stage_duration_seconds",
+    "Seconds per call of each pipeline stage, e.g. load, chunk, encode, upsert, retrieve, query, rerank, context, llm",
+    ("stage",)
+)
+vectors_total = metrics.counter(
+    "rag_vectors_total",
+    "Vectors upserted to, deleted from and retrieved from the vector store",
+    ("operation",)
+)
+tokens_total = metrics.counter(
+    "rag_tokens_total",
+    "Tokens of encoded chunks and queries, and context tokens sent to and saved from the LLM",
+    ("kind",)
+)
+cache_requests_total = metrics.counter(
+    "rag_cache_requests_total",
+    "Cache lookups by cache and result",
+    ("cache", "result")
+)
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    cache_requests_total.inc(cache=cache, result="hit" if hit else "miss")
+
+@contextmanager
+def span(stage: str, **fields: Any) -> Iterator[None]:
+    """
+    Time a pipeline stage into rag_stage_duration_seconds and log it as a
+    structured debug record (key=value message, fields also set on the record)
+    """
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        seconds = time.perf_counter() - start
+        stage_seconds.observe(seconds, stage=stage)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "stage=%s seconds=%.6f status=%s%s",
+                stage, seconds, status, "".join(f" {key}={value}" for key, value in fields.items()),
+                extra={"stage": stage, "seconds": seconds, "status": status, **fields}
+            )
@@ -0,0 +1,165 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from pathlib import Path
+from urllib.parse import quote
+import json
+import logging
+import os
+import re
+import threading
+import time
+from config.settings import Settings
+from .json_store import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# Versioned namespaces are named "<namespace>__v<version>", the version being
+# the creation time in milliseconds. Request models reject namespaces with this
+# suffix, and only versions recorded in an alias file are treated as versions.
+VERSION_SEPARATOR = "__v"
+_VERSION_PATTERN = re.compile(r"^(.+)__v(\d+)$")
+
+def parse_version(physical: str) -> Optional[Tuple[str, int]]:
+    """Split a versioned namespace into (namespace, version), or None if it is not versioned"""
+    match = _VERSION_PATTERN.match(physical)
+    if match is None:
+        return None
+    return match.group(1), int(match.group(2))
+
+class NamespaceAliasService:
+    """
+    Maps namespaces to the versioned namespaces that hold their vectors, so a
+    document can be re-ingested into a shadow namespace while queries keep
+    reading the previous version, and then switched over in one step. Each
+    alias also records the versions created for it, so only those are ever
+    treated as old versions and deleted.
+
+    The map is kept in memory and persisted as one JSON file per alias in
+    Settings.NAMESPACE_ALIAS_DIR. Other workers' changes are picked up when the
+    directory changes, checked at most once per Settings.NAMESPACE_ALIAS_RELOAD_SECONDS.
+    Namespaces without an alias resolve to themselves.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.alias_dir = Path(settings.NAMESPACE_ALIAS_DIR)
+        self._aliases: Dict[str, str] = {}
+        self._versions: Dict[str, Tuple[str, ...]] = {}
+        self._dir_mtime: Optional[int] = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _path(self, namespace: str) -> Path:
+        return self.alias_dir / f"{quote(namespace, safe='')}.json"
+
+    def _reload(self, force: bool = False) -> None:
+        now = time.monotonic()
+        checked_at = self._checked_at
+        if not force and checked_at is not None and now - checked_at < self.settings.NAMESPACE_ALIAS_RELOAD_SECONDS:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                dir_mtime = self.alias_dir.stat().st_mtime_ns
+            except FileNotFoundError:
+                dir_mtime = None
+            if dir_mtime == self._dir_mtime and not force:
+                return
+            aliases = {}
+            versions = {}
+            for path in self.alias_dir.glob("*.json"):
+                try:
+                    with open(path) as f:
+                        alias = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                aliases[alias["namespace"]] = alias["target"]
+                versions[alias["namespace"]] = tuple(alias.get("versions", ()))
+            self._aliases = aliases
+            self._versions = versions
+            self._dir_mtime = dir_mtime
+
+    def _write(self, namespace: str, target: str, versions: Tuple[str, ...]) -> None:
+        # Called with the lock held
+        write_json_atomic(self._path(namespace), {
+            "namespace": namespace,
+            "target": target,
+            "versions": list(versions),
+            "updated_at": datetime.utcnow().isoformat()
+        })
+        self._aliases = {**self._aliases, namespace: target}
+        self._versions = {**self._versions, namespace: versions}
+
+    def resolve(self, namespace: str) -> str:
+        """Get the namespace holding the vectors of a namespace"""
+        self._reload()
+        return self._aliases.get(namespace, namespace)
+
+    def versions(self, namespace: str) -> List[str]:
+        """Get the versions created for a namespace that have not been discarded"""
+        self._reload()
+        return list(self._versions.get(namespace, ()))
+
+    def logical_name(self, physical: str) -> Optional[str]:
+        """
+        Get the namespace a namespace of the vector store is listed as: the alias
+        for its current version, itself if it is not a recorded version, or None
+        if it is an old or unfinished version or has been replaced by one
+        """
+        parsed = parse_version(physical)
+        namespace = physical
+        if parsed is not None and physical in self.versions(parsed[0]):
+            namespace = parsed[0]
+        return namespace if self.resolve(namespace) == physical else None
+
+    def new_version(self, namespace: str) -> str:
+        """
+        Create a versioned namespace for a namespace, newer than its current
+        version, and record it so it can be deleted once replaced
+        """
+        self._reload(force=True)
+        with self._lock:
+            target = self._aliases.get(namespace, namespace)
+            versions = self._versions.get(namespace, ())
+            version = time.time_ns() // 1_000_000
+            for existing in versions:
+                version = max(version, parse_version(existing)[1] + 1)
+            physical = f"{namespace}{VERSION_SEPARATOR}{version}"
+            self._write(namespace, target, versions + (physical,))
+        return physical
+
+    def flip(self, namespace: str, target: str) -> str:
+        """Point a namespace at a new version and return the namespace it pointed at before"""
+        self._reload(force=True)
+        with self._lock:
+            previous = self._aliases.get(namespace, namespace)
+            versions = self._versions.get(namespace, ())
+            if target not in versions:
+                versions += (target,)
+            self._write(namespace, target, versions)
+        logger.info("Namespace %s now points at %s (was %s)", namespace, target, previous)
+        return previous
+
+    def discard_versions(self, namespace: str, physicals: Iterable[str]) -> None:
+        """Forget versions of a namespace that have been deleted"""
+        self._reload(force=True)
+        with self._lock:
+            versions = self._versions.get(namespace)
+            if versions is None:
+                return
+            discarded = set(physicals)
+            self._write(namespace, self._aliases[namespace], tuple(v for v in versions if v not in discarded))
+
+    def remove(self, namespace: str) -> None:
+        """Remove the alias of a deleted namespace"""
+        with self._lock:
+            try:
+                os.unlink(self._path(namespace))
+            except FileNotFoundError:
+                pass
+            aliases = dict(self._aliases)
+            aliases.pop(namespace, None)
+            self._aliases = aliases
+            versions = dict(self._versions)
+            versions.pop(namespace, None)
+            self._versions = versions
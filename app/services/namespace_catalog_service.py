@@ -0,0 +1,131 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+from urllib.parse import quote
+import json
+import logging
+import os
+import threading
+import time
+from config.settings import Settings
+from .json_store import write_json_atomic
+from .metrics_service import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+class NamespaceCatalogService:
+    """
+    Catalog of the namespaces in the index with per-namespace stats: vector
+    count, chunk count, source document, ingest time and ingest duration.
+
+    Ingestion and deletion write entries through to one JSON file per namespace.
+    Reads are served from memory and refreshed from those files and the index's
+    namespace list at most once per Settings.NAMESPACE_CATALOG_TTL_SECONDS, so
+    entries written by other workers show up within the TTL. Namespaces found in
+    the index without an entry, e.g. ingested before the catalog existed, are
+    listed with their vector count only. Versioned namespaces are listed under
+    the alias pointing at them.
+    """
+
+    def __init__(self, settings: Settings, vector_store_service, aliases):
+        self.settings = settings
+        self.vector_store_service = vector_store_service
+        self.aliases = aliases
+        self.catalog_dir = Path(settings.NAMESPACE_CATALOG_DIR)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._expires_at: Optional[float] = None
+        # Serializes refreshes with write-through updates, so a refresh never
+        # drops an entry written while it was reading
+        self._lock = threading.RLock()
+
+    def _path(self, namespace: str) -> Path:
+        return self.catalog_dir / f"{quote(namespace, safe='')}.json"
+
+    def _load_entries(self) -> Dict[str, Dict[str, Any]]:
+        entries = {}
+        for path in self.catalog_dir.glob("*.json"):
+            try:
+                with open(path) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            entries[entry["namespace"]] = entry
+        return entries
+
+    def _current(self) -> Dict[str, Dict[str, Any]]:
+        expires_at = self._expires_at
+        if expires_at is not None and time.monotonic() < expires_at:
+            record_cache_lookup("namespace_catalog", True)
+            return self._entries
+
+        with self._lock:
+            # Another thread may have refreshed while this one waited
+            if self._expires_at is not None and time.monotonic() < self._expires_at:
+                record_cache_lookup("namespace_catalog", True)
+                return self._entries
+            record_cache_lookup("namespace_catalog", False)
+            try:
+                vector_counts = self.vector_store_service.namespace_vector_counts()
+            except Exception:
+                if self._expires_at is None:
+                    raise
+                logger.warning("Could not refresh the namespace catalog, serving cached entries", exc_info=True)
+                self._expires_at = time.monotonic() + self.settings.NAMESPACE_CATALOG_TTL_SECONDS
+                return self._entries
+
+            entries = self._load_entries()
+            for physical, vector_count in vector_counts.items():
+                namespace = self.aliases.logical_name(physical)
+                if namespace is not None and namespace not in entries:
+                    entries[namespace] = {
+                        "namespace": namespace,
+                        "vector_count": vector_count,
+                        "chunk_count": None,
+                        "source": None,
+                        "ingested_at": None,
+                        "ingest_seconds": None
+                    }
+            self._entries = entries
+            self._expires_at = time.monotonic() + self.settings.NAMESPACE_CATALOG_TTL_SECONDS
+            return entries
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Get the entries of all namespaces, sorted by namespace"""
+        entries = self._current()
+        return [entries[namespace] for namespace in sorted(entries)]
+
+    def get(self, namespace: str) -> Optional[Dict[str, Any]]:
+        """Get the entry of a namespace, or None if it is not in the catalog"""
+        return self._current().get(namespace)
+
+    def record(
+        self,
+        namespace: str,
+        vector_count: int,
+        chunk_count: int,
+        source: Optional[str],
+        ingest_seconds: float
+    ) -> None:
+        """Write the entry of a namespace after ingesting a document into it"""
+        entry = {
+            "namespace": namespace,
+            "vector_count": vector_count,
+            "chunk_count": chunk_count,
+            "source": source,
+            "ingested_at": datetime.utcnow().isoformat(),
+            "ingest_seconds": ingest_seconds
+        }
+        with self._lock:
+            write_json_atomic(self._path(namespace), entry)
+            self._entries = {**self._entries, namespace: entry}
+
+    def remove(self, namespace: str) -> None:
+        """Remove the entry of a deleted namespace"""
+        with self._lock:
+            try:
+                os.unlink(self._path(namespace))
+            except FileNotFoundError:
+                pass
+            entries = dict(self._entries)
+            entries.pop(namespace, None)
+            self._entries = entries
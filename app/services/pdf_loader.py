@@ -0,0 +1,71 @@
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from langchain.schema import Document
+from pypdf import PdfReader
+import os
+
+# Reader of the last file opened by this worker process, reused across its page ranges
+_worker_reader: Optional[Tuple[Tuple[str, int], PdfReader]] = None
+
+def _get_reader(file_path: str) -> PdfReader:
+    global _worker_reader
+    key = (file_path, os.stat(file_path).st_mtime_ns)
+    if _worker_reader is None or _worker_reader[0] != key:
+        _worker_reader = (key, PdfReader(file_path))
+    return _worker_reader[1]
+
+def extract_page_range(file_path: str, start: int, end: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Extract the text of pages [start, end) of a PDF. Runs in a worker process,
+    so it returns plain tuples rather than Documents.
+    """
+    reader = _get_reader(file_path)
+    # Same metadata keys as PyPDFLoader, so chunk metadata and IDs do not depend on PDF_PARSE_WORKERS
+    return [
+        (reader.pages[page_number].extract_text(), {"source": file_path, "page": page_number})
+        for page_number in range(start, end)
+    ]
+
+class ParallelPDFLoader:
+    """
+    Drop-in replacement for PyPDFLoader that extracts page ranges in a process
+    pool. Pages are yielded in document order with the same text and page
+    metadata as PyPDFLoader, and only a bounded number of ranges are in flight.
+    """
+
+    def __init__(self, file_path: str, executor: Executor, pages_per_task: int = 16, max_pending_tasks: int = 8):
+        self.file_path = file_path
+        self.executor = executor
+        self.pages_per_task = max(1, pages_per_task)
+        self.max_pending_tasks = max(1, max_pending_tasks)
+
+    def lazy_load(self) -> Iterator[Document]:
+        """Lazily load pages in order"""
+        num_pages = len(PdfReader(self.file_path).pages)
+        ranges = iter(range(0, num_pages, self.pages_per_task))
+        pending = deque()
+
+        def submit_next() -> bool:
+            start = next(ranges, None)
+            if start is None:
+                return False
+            end = min(start + self.pages_per_task, num_pages)
+            pending.append(self.executor.submit(extract_page_range, self.file_path, start, end))
+            return True
+
+        try:
+            while len(pending) < self.max_pending_tasks and submit_next():
+                pass
+            while pending:
+                pages = pending.popleft().result()
+                submit_next()
+                for text, metadata in pages:
+                    yield Document(page_content=text, metadata=metadata)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def load(self) -> List[Document]:
+        """Load all pages"""
+        return list(self.lazy_load())
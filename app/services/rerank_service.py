@@ -0,0 +1,71 @@
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+import threading
+from config.settings import Settings
+from .corpus_stats_service import CorpusStats, CorpusStatsService
+
+# Term frequencies and length of one chunk
+TermFrequencies = Tuple[Counter, int]
+
+class RerankService:
+    """
+    BM25 reranker with a per-namespace model: the namespace's persisted corpus
+    statistics plus an LRU cache of chunk term frequencies keyed by chunk ID.
+    Chunk IDs are content-addressed, so cached term frequencies stay valid
+    across re-ingestion; only removed chunks need to be dropped.
+    """
+
+    def __init__(self, settings: Settings, corpus_stats: CorpusStatsService):
+        self.settings = settings
+        self.corpus_stats = corpus_stats
+        self.k1 = settings.BM25_K1
+        self.b = settings.BM25_B
+        self.max_chunks = settings.RERANK_CACHE_MAX_CHUNKS
+        self._term_frequencies: Dict[str, "OrderedDict[str, TermFrequencies]"] = {}
+        self._lock = threading.Lock()
+
+    def add(self, namespace: str, chunk_id: str, tokens: List[str]) -> None:
+        """Cache the term frequencies of a chunk, normally at ingestion time"""
+        if self.max_chunks <= 0:
+            return
+        with self._lock:
+            cache = self._term_frequencies.setdefault(namespace, OrderedDict())
+            cache[chunk_id] = (Counter(tokens), len(tokens))
+            cache.move_to_end(chunk_id)
+            while len(cache) > self.max_chunks:
+                cache.popitem(last=False)
+
+    def get(self, namespace: str, chunk_id: str) -> Optional[TermFrequencies]:
+        with self._lock:
+            cache = self._term_frequencies.get(namespace)
+            if cache is None or chunk_id not in cache:
+                return None
+            cache.move_to_end(chunk_id)
+            return cache[chunk_id]
+
+    def remove(self, namespace: str, chunk_ids: Iterable[str]) -> None:
+        """Forget chunks removed from a namespace"""
+        with self._lock:
+            cache = self._term_frequencies.get(namespace)
+            if cache is not None:
+                for chunk_id in chunk_ids:
+                    cache.pop(chunk_id, None)
+
+    def drop(self, namespace: str) -> None:
+        """Forget a deleted namespace"""
+        with self._lock:
+            self._term_frequencies.pop(namespace, None)
+
+    def score(self, query_tokens: List[str], documents: List[TermFrequencies], stats: CorpusStats) -> List[float]:
+        """BM25 score of each document for the query tokens"""
+        avg_doc_length = stats.avg_doc_length or 1.0
+        scores = []
+        for term_frequencies, length in documents:
+            norm = self.k1 * (1 - self.b + self.b * length / avg_doc_length)
+            score = 0.0
+            for token in query_tokens:
+                tf = term_frequencies.get(token)
+                if tf:
+                    score += stats.idf.get(token, 0.0) * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
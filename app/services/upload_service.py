@@ -0,0 +1,176 @@
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
+from pathlib import Path
+import logging
+import os
+import tempfile
+from fastapi.concurrency import run_in_threadpool
+from config.settings import Settings
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+# Form fields other than the file are short, e.g. the namespace
+MAX_FIELD_BYTES = 64 * 1024
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds Settings.UPLOAD_MAX_BYTES"""
+
+class ReceivedUpload(NamedTuple):
+    path: str
+    filename: Optional[str]
+    fields: Dict[str, str]
+
+class _Part:
+    def __init__(self):
+        self.headers: Dict[bytes, bytes] = {}
+        self.name = ""
+        self.filename: Optional[str] = None
+        self.data: List[bytes] = []
+
+class UploadService:
+    """
+    Receives multipart/form-data PDF uploads. The file part is streamed straight
+    to a temp file in Settings.UPLOAD_DIR as the request body arrives, so the
+    document is never held in memory and the body is cut off at
+    Settings.UPLOAD_MAX_BYTES. The caller owns the file and removes it with
+    remove() once it has been ingested.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.upload_dir = Path(settings.UPLOAD_DIR)
+
+    async def receive(
+        self,
+        content_type: str,
+        content_length: Optional[str],
+        stream: AsyncIterator[bytes],
+        file_field: str = "file"
+    ) -> ReceivedUpload:
+        """
+        Parse a multipart body with one PDF file part and short text fields.
+
+        Args:
+            content_type: Content-Type header of the request, with the boundary
+            content_length: Content-Length header of the request, if sent
+            stream: Chunks of the request body
+            file_field: Name of the form field holding the file
+
+        Raises:
+            UploadTooLargeError: if the body exceeds Settings.UPLOAD_MAX_BYTES
+            ValueError: if the body is not a multipart form with a PDF file
+        """
+        max_bytes = self.settings.UPLOAD_MAX_BYTES
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise UploadTooLargeError(
+                f"Upload is {content_length} bytes, larger than the limit of {max_bytes} bytes"
+            )
+
+        media_type, params = parse_options_header(content_type or "")
+        boundary = params.get(b"boundary")
+        if media_type != b"multipart/form-data" or not boundary:
+            raise ValueError("Request must be multipart/form-data with a boundary")
+
+        fields: Dict[str, str] = {}
+        field_bytes = 0
+        filename: Optional[str] = None
+        file_found = False
+        part = _Part()
+        header_field = bytearray()
+        header_value = bytearray()
+        # Parser callbacks only collect data; writes to the temp file happen between chunks
+        pending: List[bytes] = []
+
+        def on_part_begin():
+            nonlocal part
+            part = _Part()
+
+        def on_header_field(data, start, end):
+            header_field.extend(data[start:end])
+
+        def on_header_value(data, start, end):
+            header_value.extend(data[start:end])
+
+        def on_header_end():
+            part.headers[bytes(header_field).lower()] = bytes(header_value)
+            header_field.clear()
+            header_value.clear()
+
+        def on_headers_finished():
+            nonlocal file_found, filename
+            _, options = parse_options_header(part.headers.get(b"content-disposition", b""))
+            part.name = options.get(b"name", b"").decode("utf-8", "replace")
+            if b"filename" in options:
+                part.filename = options[b"filename"].decode("utf-8", "replace")
+            if part.name == file_field and part.filename is not None:
+                if file_found:
+                    raise ValueError(f"Only one file may be sent in the '{file_field}' field")
+                file_found = True
+                filename = part.filename
+
+        def on_part_data(data, start, end):
+            nonlocal field_bytes
+            if part.name == file_field and part.filename is not None:
+                pending.append(data[start:end])
+                return
+            field_bytes += end - start
+            if field_bytes > MAX_FIELD_BYTES:
+                raise ValueError(f"Form fields exceed {MAX_FIELD_BYTES} bytes")
+            part.data.append(data[start:end])
+
+        def on_part_end():
+            if part.filename is None:
+                fields[part.name] = b"".join(part.data).decode("utf-8", "replace")
+
+        parser = MultipartParser(boundary, {
+            "on_part_begin": on_part_begin,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+        })
+
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.upload_dir, prefix="upload-", suffix=".pdf")
+        try:
+            received = 0
+            written = 0
+            head = b""
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in stream:
+                    received += len(chunk)
+                    if received > max_bytes:
+                        raise UploadTooLargeError(f"Upload exceeds the limit of {max_bytes} bytes")
+                    parser.write(chunk)
+                    if pending:
+                        data = b"".join(pending)
+                        pending.clear()
+                        if len(head) < 5:
+                            head += data[:5 - len(head)]
+                        written += len(data)
+                        await run_in_threadpool(f.write, data)
+                parser.finalize()
+
+            if not file_found:
+                raise ValueError(f"Missing PDF file in the '{file_field}' form field")
+            if not head.startswith(b"%PDF-"):
+                raise ValueError("Uploaded file is not a PDF")
+        except BaseException:
+            self.remove(temp_path)
+            raise
+
+        logger.info("Received upload %s (%d bytes)", filename, written)
+        return ReceivedUpload(temp_path, filename, fields)
+
+    def remove(self, file_path: str) -> None:
+        """Remove a received upload"""
+        try:
+            os.unlink(file_path)
+        except FileNotFoundError:
+            pass
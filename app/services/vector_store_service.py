@@ -1,46 +1,235 @@
 from pinecone import Pinecone
 from langchain.schema import Document
-from typing import List, Dict, Any
-import math
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Protocol, Union
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import asyncio
+import functools
+import json
+import logging
+import threading
+import time
 from config.settings import Settings
 from .embedding_service import EmbeddingService
+from .ingestion_job_service import IngestionProgress
+from .local_sparse_index import LocalSparseIndex
+from .metrics_service import span, vectors_total
+
+logger = logging.getLogger(__name__)
+
+class SparseIndex(Protocol):
+    """Subset of the Pinecone Index API that VectorStoreService relies on"""
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = "", **kwargs) -> Any: ...
+
+    def query(self, sparse_vector: Dict[str, List], top_k: int, namespace: str = "",
+              include_metadata: bool = False, vector: Any = None, **kwargs) -> Any: ...
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False, namespace: str = "", **kwargs) -> Any: ...
+
+    def describe_index_stats(self, **kwargs) -> Any: ...
+
+def create_index(settings: Settings) -> SparseIndex:
+    """Create the index selected by Settings.VECTOR_STORE_BACKEND"""
+    backend = settings.VECTOR_STORE_BACKEND
+    if backend == "pinecone":
+        return Pinecone(api_key=settings.PINECONE_API_KEY).Index(settings.PINECONE_INDEX_NAME)
+    if backend == "local":
+        return LocalSparseIndex(settings.LOCAL_INDEX_DIR)
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+async def create_async_index(settings: Settings) -> Optional[Any]:
+    """
+    Create a native asyncio client for the configured index, or None when the
+    backend or the installed Pinecone client has none. Must run in the event
+    loop that will use the client.
+    """
+    if settings.VECTOR_STORE_BACKEND != "pinecone":
+        return None
+    pc = Pinecone(api_key=settings.PINECONE_API_KEY)
+    if not hasattr(pc, "IndexAsyncio"):
+        return None
+    try:
+        description = await asyncio.to_thread(pc.describe_index, settings.PINECONE_INDEX_NAME)
+        return pc.IndexAsyncio(host=description.host)
+    except Exception as e:
+        # Usually the pinecone[asyncio] extra is not installed
+        logger.warning("Pinecone asyncio client unavailable (%s), querying from threads", e)
+        return None
 
 class VectorStoreService:
-    def __init__(self, settings: Settings, embedding_service: EmbeddingService):
+    def __init__(
+        self,
+        settings: Settings,
+        embedding_service: EmbeddingService,
+        index: Optional[SparseIndex] = None,
+        async_index: Optional[Any] = None
+    ):
+        """
+        Args:
+            settings: Application settings
+            embedding_service: Service used to encode queries
+            index: Optional object implementing the SparseIndex API; defaults to the
+                backend selected by Settings.VECTOR_STORE_BACKEND
+            async_index: Optional object whose query method is a coroutine, used by the
+                async search methods; defaults to Pinecone's asyncio client when the
+                index is not injected and the client supports it
+        """
         self.settings = settings
         self.embedding_service = embedding_service
-        self.pc = Pinecone(api_key=settings.PINECONE_API_KEY)
-        self.index = self.pc.Index(settings.PINECONE_INDEX_NAME)
+        # The configured index is created on first use; the Pinecone client calls the API when created
+        self._index = index
+        self._index_lock = threading.Lock()
+        self.async_index = async_index
+        # Only look for a native asyncio client for an index this service created itself
+        self._async_index_resolved = async_index is not None or index is not None
+        self._query_executor: Optional[ThreadPoolExecutor] = None
+        self._query_executor_lock = threading.Lock()
+        # Caps upserts in flight across concurrent uploads, e.g. several ingestion jobs
+        self._upsert_slots = threading.BoundedSemaphore(max(1, settings.UPSERT_MAX_IN_FLIGHT_TOTAL))
+
+    @property
+    def index(self) -> SparseIndex:
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = create_index(self.settings)
+        return self._index
+
+    @index.setter
+    def index(self, index: SparseIndex) -> None:
+        self._index = index
+
+    def warm_up(self) -> None:
+        """Connect to the index ahead of the first request"""
+        self.index
+
+    def _flush(self) -> None:
+        """Persist index changes for backends that keep them in memory"""
+        flush = getattr(self._index, "flush", None)
+        if flush is not None:
+            flush()
+
+    @staticmethod
+    def _iter_batches(vectors: Iterable[Dict[str, Any]], max_vectors: int, max_bytes: int) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Group vectors into batches bounded by vector count and by serialized size,
+        so a batch of chunks with large metadata text stays under the request limit
+        """
+        batch: List[Dict[str, Any]] = []
+        batch_bytes = 0
+        for vector in vectors:
+            vector_bytes = len(json.dumps(vector, separators=(",", ":")))
+            if batch and (len(batch) >= max_vectors or batch_bytes + vector_bytes > max_bytes):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(vector)
+            batch_bytes += vector_bytes
+        if batch:
+            yield batch
+
+    def _upsert_batch(self, batch: List[Dict[str, Any]], namespace: str) -> float:
+        """Upsert one batch and return its latency in seconds"""
+        with self._upsert_slots:
+            start = time.perf_counter()
+            with span("upsert", namespace=namespace, vectors=len(batch)):
+                self.index.upsert(
+                    vectors=batch,
+                    namespace=namespace
+                )
+            return time.perf_counter() - start
 
-    def upload_vectors(self, vectors: List[Dict[str, Any]], namespace: str, batch_size: int = 50):
+    def upload_vectors(
+        self,
+        vectors: Iterable[Dict[str, Any]],
+        namespace: str,
+        batch_size: Optional[int] = None,
+        progress: Optional[IngestionProgress] = None
+    ) -> Dict[str, Any]:
         """
-        Upload vectors to Pinecone in batches
+        Upload vectors to the index in concurrent batches
+        
+        Batches are bounded by Settings.UPSERT_BATCH_SIZE vectors and
+        Settings.UPSERT_MAX_BATCH_BYTES of serialized payload, and up to
+        Settings.UPSERT_MAX_IN_FLIGHT batches are upserted at once (and at most
+        Settings.UPSERT_MAX_IN_FLIGHT_TOTAL across concurrent uploads). Vectors may be
+        any iterable, including a generator; it is consumed as batches are sent.
         
         Args:
-            vectors: List of vectors to upload
+            vectors: Vectors to upload
             namespace: Required namespace to upload vectors to
-            batch_size: Size of each batch for upload
+            batch_size: Maximum number of vectors per batch (defaults to Settings.UPSERT_BATCH_SIZE)
+            progress: Optional progress hooks, checked for cancellation before each batch
+        
+        Returns:
+            Upload report with vector and batch counts, per-batch latencies and vectors/sec
         """
-        if not vectors:
-            return
-
         if not namespace:
             raise ValueError("Namespace is required for uploading vectors")
 
-        print(f"vector_store_service: Uploading vectors to namespace: {namespace}")
-        total_batches = math.ceil(len(vectors) / batch_size)
-        
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            current_batch = (i // batch_size) + 1
-            
-            # Upload batch to Pinecone using the provided namespace
-            self.index.upsert(
-                vectors=batch,
-                namespace=namespace
+        progress = progress or IngestionProgress()
+        batch_size = batch_size or self.settings.UPSERT_BATCH_SIZE
+        max_in_flight = max(1, self.settings.UPSERT_MAX_IN_FLIGHT)
+
+        logger.info("Uploading vectors to namespace: %s", namespace)
+        batch_latencies: List[float] = []
+        total_vectors = 0
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="upsert") as executor:
+            pending = {}
+
+            def collect(done):
+                nonlocal total_vectors
+                for future in done:
+                    batch_number, batch_len = pending.pop(future)
+                    latency = future.result()
+                    batch_latencies.append(latency)
+                    total_vectors += batch_len
+                    progress.add_upserted(batch_len)
+                    vectors_total.inc(batch_len, operation="upserted")
+                    logger.debug(
+                        "Uploaded batch %d (%d vectors, %.0f ms) to namespace: %s",
+                        batch_number, batch_len, latency * 1000, namespace
+                    )
+
+            try:
+                batches = self._iter_batches(vectors, batch_size, self.settings.UPSERT_MAX_BATCH_BYTES)
+                for batch_number, batch in enumerate(batches, start=1):
+                    progress.check_cancelled()
+                    # Keep at most max_in_flight batches outstanding
+                    while len(pending) >= max_in_flight:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    future = executor.submit(self._upsert_batch, batch, namespace)
+                    pending[future] = (batch_number, len(batch))
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+            finally:
+                self._flush()
+
+        elapsed = time.perf_counter() - start
+        report = {
+            "namespace": namespace,
+            "vectors": total_vectors,
+            "batches": len(batch_latencies),
+            "seconds": elapsed,
+            "vectors_per_second": total_vectors / elapsed if elapsed > 0 else 0.0,
+            "batch_latencies": batch_latencies
+        }
+        if batch_latencies:
+            logger.info(
+                "Uploaded %d vectors in %d batches to namespace: %s (%.0f vectors/sec, max batch latency %.0f ms)",
+                total_vectors, len(batch_latencies), namespace, report["vectors_per_second"],
+                max(batch_latencies) * 1000
             )
-            
-            print(f"Uploaded batch {current_batch} of {total_batches} to namespace: {namespace}")
+        return report
 
     def similarity_search(self, query: str, namespace: str, k: int = 30) -> List[Document]:
         """
@@ -54,26 +243,127 @@ class VectorStoreService:
         if not namespace:
             raise ValueError("Namespace is required for similarity search")
 
-        print(f"vector_store_service: Searching in namespace: {namespace}")
+        logger.debug("Searching in namespace: %s", namespace)
         
-        # Get sparse vector for the query
-        query_sparse_vectors = self.embedding_service.get_sparse_embeddings([query])
-        if not query_sparse_vectors or not query_sparse_vectors[0]["indices"]:
-            print("Warning: No valid sparse vector generated for query")
+        # Get sparse vector for the query using the namespace's corpus statistics
+        query_sparse_vector = self.embedding_service.get_query_sparse_embedding(query, namespace)
+        return self._query(query_sparse_vector, namespace, k)
+
+    async def asimilarity_search(self, query: str, namespace: str, k: int = 30) -> List[Document]:
+        """
+        Async counterpart of similarity_search. The query is encoded on a worker
+        thread, then Pinecone's asyncio client is awaited when available, otherwise
+        the blocking query runs on a dedicated thread pool, so the event loop
+        stays free throughout.
+        """
+        if not namespace:
+            raise ValueError("Namespace is required for similarity search")
+
+        logger.debug("Searching in namespace: %s", namespace)
+        # Encoding may reload the namespace's corpus statistics from disk
+        query_sparse_vector = await asyncio.to_thread(
+            self.embedding_service.get_query_sparse_embedding, query, namespace
+        )
+        if not query_sparse_vector["indices"]:
+            logger.warning("No valid sparse vector generated for query")
+            return []
+
+        query_kwargs = {
+            "vector": None,  # No dense vector
+            "sparse_vector": query_sparse_vector,
+            "top_k": k,
+            "namespace": namespace,
+            "include_metadata": True
+        }
+        async_index = await self._get_async_index()
+        with span("query", namespace=namespace, k=k):
+            if async_index is not None:
+                results = await async_index.query(**query_kwargs)
+            else:
+                loop = asyncio.get_running_loop()
+                results = await loop.run_in_executor(
+                    self._get_query_executor(),
+                    functools.partial(self.index.query, **query_kwargs)
+                )
+        return self._to_documents(results)
+
+    async def _get_async_index(self) -> Optional[Any]:
+        """Create the asyncio client on first use, inside the running event loop"""
+        if not self._async_index_resolved:
+            self._async_index_resolved = True
+            self.async_index = await create_async_index(self.settings)
+        return self.async_index
+
+    def _get_query_executor(self) -> ThreadPoolExecutor:
+        """Threads for async queries against a blocking index; sized for many in-flight requests"""
+        with self._query_executor_lock:
+            if self._query_executor is None:
+                self._query_executor = ThreadPoolExecutor(
+                    max_workers=self.settings.VECTOR_STORE_ASYNC_THREADS,
+                    thread_name_prefix="aquery"
+                )
+            return self._query_executor
+
+    async def aclose(self) -> None:
+        """Close the asyncio client and the async query threads"""
+        if self.async_index is not None and hasattr(self.async_index, "close"):
+            await self.async_index.close()
+        if self._query_executor is not None:
+            self._query_executor.shutdown(wait=False)
+            self._query_executor = None
+
+    def similarity_search_batch(
+        self,
+        queries: List[str],
+        namespaces: List[str],
+        ks: List[int]
+    ) -> List[Union[List[Document], Exception]]:
+        """
+        Search for several queries at once. Queries are encoded in one pass and
+        the index is queried concurrently, at most Settings.QUERY_MAX_CONCURRENCY
+        requests at a time.
+
+        Returns the documents of each query, or the exception its search raised.
+        """
+        if not all(namespaces):
+            raise ValueError("Namespace is required for similarity search")
+
+        logger.debug("Searching %d queries", len(queries))
+        sparse_vectors = self.embedding_service.get_query_sparse_embeddings(queries, namespaces)
+        max_workers = max(1, min(self.settings.QUERY_MAX_CONCURRENCY, len(queries)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query") as executor:
+            futures = [
+                executor.submit(self._query, sparse_vector, namespace, k)
+                for sparse_vector, namespace, k in zip(sparse_vectors, namespaces, ks)
+            ]
+            results: List[Union[List[Document], Exception]] = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(e)
+        return results
+
+    def _query(self, query_sparse_vector: Dict[str, List], namespace: str, k: int) -> List[Document]:
+        """Query the index with an encoded query and convert the matches to Documents"""
+        if not query_sparse_vector["indices"]:
+            logger.warning("No valid sparse vector generated for query")
             return []
-            
-        query_sparse_vector = query_sparse_vectors[0]
         
         # Perform sparse vector search
-        results = self.index.query(
-            vector=None,  # No dense vector
-            sparse_vector=query_sparse_vector,
-            top_k=k,
-            namespace=namespace,
-            include_metadata=True
-        )
-        
-        # Convert results to Document objects
+        with span("query", namespace=namespace, k=k):
+            results = self.index.query(
+                vector=None,  # No dense vector
+                sparse_vector=query_sparse_vector,
+                top_k=k,
+                namespace=namespace,
+                include_metadata=True
+            )
+        return self._to_documents(results)
+
+    @staticmethod
+    def _to_documents(results: Any) -> List[Document]:
+        """Convert query matches to Document objects"""
         documents = []
         for match in results.matches:
             doc = Document(
@@ -82,27 +372,53 @@ class VectorStoreService:
                     'id': match.id,  # Include the document ID
                     'page': match.metadata.get('page'),
                     'page_label': match.metadata.get('page_label'),
+                    'start_index': match.metadata.get('start_index'),
                     'score': match.score
                 }
             )
             documents.append(doc)
             
+        vectors_total.inc(len(documents), operation="retrieved")
         return documents
 
+    def delete_vectors(self, ids: Iterable[str], namespace: str, batch_size: int = 1000) -> None:
+        """
+        Delete vectors by ID from a namespace
+        
+        Args:
+            ids: IDs of the vectors to delete
+            namespace: Required namespace to delete from
+            batch_size: IDs per delete request (Pinecone accepts at most 1000)
+        """
+        if not namespace:
+            raise ValueError("Namespace is required")
+        ids = list(ids)
+        for i in range(0, len(ids), batch_size):
+            self.index.delete(ids=ids[i:i + batch_size], namespace=namespace)
+        self._flush()
+        vectors_total.inc(len(ids), operation="deleted")
+        logger.info("Deleted %d vectors from namespace: %s", len(ids), namespace)
+
     def delete_namespace(self, namespace: str) -> None:
         """Delete a namespace from the vector store"""
         if not namespace:
             raise ValueError("Namespace is required")
         self.index.delete(delete_all=True, namespace=namespace)
+        self._flush()
 
-    def list_namespaces(self) -> List[str]:
-        """List all namespaces in the vector store"""
+    def namespace_vector_counts(self) -> Dict[str, int]:
+        """Get the vector count of every namespace in the vector store"""
         try:
             # Get index statistics which includes namespace information
             stats = self.index.describe_index_stats()
-            # Extract namespaces from the stats
-            namespaces = list(stats.get('namespaces', {}).keys())
-            return namespaces
+            return {
+                namespace: int(summary["vector_count"])
+                for namespace, summary in stats.get('namespaces', {}).items()
+            }
         except Exception as e:
-            print(f"Error listing namespaces: {str(e)}")
-            raise 
\ No newline at end of file
+            logger.error("Error listing namespaces: %s", e)
+            raise
+
+    def list_namespaces(self) -> List[str]:
+        """List all namespaces in the vector store"""
+        return list(self.namespace_vector_counts()) 
\ No newline at end of file
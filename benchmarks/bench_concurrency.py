@@ -0,0 +1,153 @@
+"""
+Benchmark query throughput of one API worker under concurrent requests.
+
+Runs the real FastAPI app in-process with the bundled PDF ingested into the
+simulated Pinecone index and a fake chat model, both with simulated network
+latency. Compares the async query endpoint with a blocking endpoint that calls
+the synchronous services from an async handler, as query_document used to.
+
+Usage (from the repository root):
+    python benchmarks/bench_concurrency.py --requests 64 --concurrency 1 8 32 --index-latency 0.05 --llm-latency 0.5
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Run entirely offline: local index, no caches, dummy keys
+# Removed once the benchmark exits
+_data_dir = tempfile.TemporaryDirectory(prefix="bench-concurrency-")
+for key, value in {
+    "OPENAI_API_KEY": "offline",
+    "PINECONE_API_KEY": "offline",
+    "PINECONE_INDEX": "offline",
+    "VECTOR_STORE_BACKEND": "local",
+    "LOCAL_INDEX_DIR": os.path.join(_data_dir.name, "local_index"),
+    "CORPUS_STATS_DIR": os.path.join(_data_dir.name, "corpus_stats"),
+    "MANIFEST_DIR": os.path.join(_data_dir.name, "manifests"),
+    "NAMESPACE_CATALOG_DIR": os.path.join(_data_dir.name, "namespace_catalog"),
+    "NAMESPACE_ALIAS_DIR": os.path.join(_data_dir.name, "namespace_aliases"),
+    "DOWNLOAD_CACHE_DIR": os.path.join(_data_dir.name, "download_cache"),
+    "UPLOAD_DIR": os.path.join(_data_dir.name, "uploads"),
+    "ANSWER_CACHE_PATH": os.path.join(_data_dir.name, "answer_cache.sqlite3"),
+    "RETRIEVAL_CACHE_MAX_ENTRIES": "0",
+    "ANSWER_CACHE_BACKEND": "none",
+}.items():
+    os.environ[key] = value
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import httpx  # noqa: E402
+from fastapi import Depends  # noqa: E402
+from langchain_core.language_models import FakeListChatModel  # noqa: E402
+from langchain_core.messages import AIMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration, ChatResult  # noqa: E402
+from dependencies import container, get_document_service, get_llm_service  # noqa: E402
+from main import app  # noqa: E402
+from models.schemas import QueryRequest, QueryResponse  # noqa: E402
+from services.document_service import DocumentService  # noqa: E402
+from services.llm_service import LLMService  # noqa: E402
+from pinecone_standin import SimulatedPineconeIndex, SimulatedAsyncPineconeIndex  # noqa: E402
+
+QUESTIONS = [
+    "What is the role of desire in achieving riches?",
+    "How does persistence help overcome failure?",
+    "What is the sixth sense?",
+    "Why is faith important?",
+    "What does the master mind mean?",
+    "How should one use autosuggestion?",
+]
+
+class SlowFakeChatModel(FakeListChatModel):
+    """Fake chat model that waits like a remote LLM: blocking when invoked, awaiting when ainvoked"""
+    latency: float = 0.5
+
+    def _call(self, *args, **kwargs) -> str:
+        time.sleep(self.latency)
+        return super()._call(*args, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        # The default runs _generate in the default executor; await instead, like ChatOpenAI
+        await asyncio.sleep(self.latency)
+        answer = FakeListChatModel._call(self, messages, stop)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer))])
+
+@app.post("/bench/blocking", response_model=QueryResponse)
+async def blocking_query(
+    request: QueryRequest,
+    document_service: DocumentService = Depends(get_document_service),
+    llm_service: LLMService = Depends(get_llm_service)
+) -> QueryResponse:
+    """The query handler as it was before the async service layer"""
+    results = document_service.similarity_search(request.query, k=request.k, namespace=request.namespace)
+    return QueryResponse(**llm_service.get_structured_answer(request.query, results))
+
+async def run_load(client: httpx.AsyncClient, path: str, requests: int, concurrency: int, namespace: str):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(path, json={
+                "query": QUESTIONS[i % len(QUESTIONS)],
+                "namespace": namespace,
+                "k": 10
+            })
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return time.perf_counter() - start, sorted(latencies)
+
+async def main_async(args):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for concurrency in args.concurrency:
+            for name, path in (("blocking", "/bench/blocking"), ("async", "/api/v1/query")):
+                elapsed, latencies = await run_load(client, path, args.requests, concurrency, args.namespace)
+                print(
+                    f"{name:<8} concurrency={concurrency:<4} requests/sec={args.requests / elapsed:7.2f} "
+                    f"p50={statistics.median(latencies) * 1000:7.0f}ms p95={latencies[int(len(latencies) * 0.95)] * 1000:7.0f}ms"
+                )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--index-latency", type=float, default=0.05, help="Simulated vector store round-trip in seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Simulated LLM response time in seconds")
+    parser.add_argument("--thread-fallback", action="store_true",
+                        help="Query the index from threads instead of the simulated asyncio client")
+    parser.add_argument("--namespace", default="bench")
+    args = parser.parse_args()
+
+    document_service = container.document_service
+    vector_store_service = document_service.vector_store_service
+    index = SimulatedPineconeIndex(latency=0.0, jitter=0.0, seed=0)
+    vector_store_service.index = index
+    document_service.process_and_upload_document(args.namespace)
+    index.latency = args.index_latency
+    index.jitter = args.index_latency / 5
+    if not args.thread_fallback:
+        vector_store_service.async_index = SimulatedAsyncPineconeIndex(index)
+    vector_store_service._async_index_resolved = True
+
+    llm_service = LLMService(
+        container.settings,
+        llm=SlowFakeChatModel(responses=["A short answer."], latency=args.llm_latency)
+    )
+    app.dependency_overrides[get_llm_service] = lambda: llm_service
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        _data_dir.cleanup()
@@ -0,0 +1,87 @@
+"""
+Compare the "matrix" and "legacy" sparse encoders of EmbeddingService on the
+chunks of the bundled PDF: encoding time, and how far the chunks each one
+ranks highest for a set of questions agree.
+
+Chunks are ranked by the dot product of their sparse vector with the query
+vector, the score the vector store ranks them by. Queries are encoded with the
+corpus statistics of the encoder that produced the chunk vectors. The
+legacy encoder weights each token of a chunk by its best score anywhere in the
+corpus rather than in that chunk, so the rankings only partly agree. The
+benchmark exits with status 1 if the mean top-k overlap is below --min-overlap.
+
+Usage (from the repository root):
+    python benchmarks/bench_encoder.py --repeat 3 --k 10
+"""
+from pathlib import Path
+from typing import Dict, List
+import argparse
+import os
+import sys
+import time
+
+# The benchmark never talks to OpenAI or Pinecone, but Settings requires the keys
+for key in ("OPENAI_API_KEY", "PINECONE_API_KEY", "PINECONE_INDEX"):
+    os.environ.setdefault(key, "offline")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from langchain_community.document_loaders import PyPDFLoader  # noqa: E402
+from config.settings import Settings  # noqa: E402
+from services.chunking_service import ChunkingService  # noqa: E402
+from services.embedding_service import EmbeddingService  # noqa: E402
+from bench_tokenizer import QUESTIONS  # noqa: E402
+
+ENCODERS = ("legacy", "matrix")
+
+def top_k(query_vector: Dict[str, List], chunk_vectors: List[Dict[str, List]], k: int) -> List[int]:
+    """Indices of the k chunks with the highest dot product with the query"""
+    query = dict(zip(query_vector["indices"], query_vector["values"]))
+    scores = []
+    for i, vector in enumerate(chunk_vectors):
+        score = sum(query.get(index, 0.0) * value for index, value in zip(vector["indices"], vector["values"]))
+        if score > 0:
+            scores.append((-score, i))
+    return [i for _, i in sorted(scores)[:k]]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=Settings().PDF_PATH)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--k", type=int, default=10, help="Chunks retrieved per question")
+    parser.add_argument("--min-overlap", type=float, default=0.3,
+                        help="Fail if the mean share of top-k chunks both encoders retrieve is lower")
+    args = parser.parse_args()
+
+    settings = Settings()
+    chunks = ChunkingService(settings).chunk_documents(PyPDFLoader(args.pdf).load())
+    texts = [doc.page_content for doc in chunks]
+    print(f"{len(chunks)} chunks from {args.pdf}")
+
+    results = {}
+    for encoder in ENCODERS:
+        service = EmbeddingService(settings.model_copy(update={"SPARSE_ENCODER": encoder}))
+        service.warm_up()
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            vectors, stats, _ = service._encode_corpus(texts)
+            best = min(best, time.perf_counter() - start)
+        rankings = [top_k(service._encode_query(question, stats), vectors, args.k) for question in QUESTIONS]
+        results[encoder] = (best, rankings)
+        print(f"{encoder:<7} {best * 1000:10.1f}ms  {len(texts) / best:10.0f} chunks/s")
+    print(f"speedup {results['legacy'][0] / results['matrix'][0]:.1f}x")
+
+    overlaps = []
+    for question, legacy, matrix in zip(QUESTIONS, results["legacy"][1], results["matrix"][1]):
+        overlap = len(set(legacy) & set(matrix)) / args.k
+        overlaps.append(overlap)
+        print(f"top-{args.k} overlap {overlap:4.0%}  {question}")
+    mean_overlap = sum(overlaps) / len(overlaps)
+    print(f"mean top-{args.k} overlap {mean_overlap:.0%}")
+    if mean_overlap < args.min_overlap:
+        print(f"Mean overlap is below {args.min_overlap:.0%}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
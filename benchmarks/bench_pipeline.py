@@ -0,0 +1,222 @@
+"""
+Benchmark every stage of the ingestion and query pipelines offline.
+
+Ingests the bundled PDF into the simulated Pinecone index and answers
+questions with a fake chat model, timing each stage: PDF load, chunking,
+sparse encoding, vector preparation, upload, similarity search, rerank,
+context packing and answer generation. Results are written as JSON and can be
+compared against a saved baseline run; the script exits with status 1 when a
+stage regressed by more than the threshold.
+
+Usage (from the repository root):
+    python benchmarks/bench_pipeline.py --output baseline.json
+    python benchmarks/bench_pipeline.py --output current.json --baseline baseline.json --threshold 0.2
+"""
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Run entirely offline: no caches, temporary data directories, dummy keys
+# Removed once the benchmark exits
+_data_dir = tempfile.TemporaryDirectory(prefix="bench-pipeline-")
+for key, value in {
+    "OPENAI_API_KEY": "offline",
+    "PINECONE_API_KEY": "offline",
+    "PINECONE_INDEX": "offline",
+    "CORPUS_STATS_DIR": os.path.join(_data_dir.name, "corpus_stats"),
+    "MANIFEST_DIR": os.path.join(_data_dir.name, "manifests"),
+    "RETRIEVAL_CACHE_MAX_ENTRIES": "0",
+    "ANSWER_CACHE_BACKEND": "none",
+    "QUERY_TOKEN_CACHE_MAX_ENTRIES": "0",
+}.items():
+    os.environ[key] = value
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "app"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from langchain_community.document_loaders import PyPDFLoader  # noqa: E402
+from langchain_core.language_models import FakeListChatModel  # noqa: E402
+from config.settings import Settings  # noqa: E402
+from services.chunking_service import ChunkingService  # noqa: E402
+from services.embedding_service import EmbeddingService  # noqa: E402
+from services.llm_service import LLMService  # noqa: E402
+from services.vector_store_service import VectorStoreService  # noqa: E402
+from pinecone_standin import SimulatedPineconeIndex  # noqa: E402
+
+NAMESPACE = "bench-pipeline"
+
+QUESTIONS = [
+    "What is the role of desire in achieving riches?",
+    "How does persistence help overcome failure?",
+    "What is the sixth sense?",
+    "Why is faith important?",
+    "What does the master mind mean?",
+    "How should one use autosuggestion?",
+    "What are the six ways to turn desires into gold?",
+    "How does the subconscious mind work?",
+]
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """Summary of a stage's samples, each the seconds taken by one operation"""
+    ordered = sorted(samples)
+    return {
+        "samples": len(ordered),
+        "median": statistics.median(ordered),
+        "mean": statistics.mean(ordered),
+        "min": ordered[0],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+    }
+
+def measure(function: Callable[[], Any]):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run(args) -> Dict[str, Any]:
+    settings = Settings()
+    chunking_service = ChunkingService(settings)
+    embedding_service = EmbeddingService(settings)
+    embedding_service.warm_up()
+    llm_service = LLMService(settings, llm=FakeListChatModel(responses=["A short answer."]))
+    llm_service.warm_up()
+    samples: Dict[str, List[float]] = {}
+
+    # Ingestion stages, each timed over the whole document
+    for _ in range(args.repeat):
+        elapsed, pages = measure(lambda: PyPDFLoader(args.pdf).load())
+        samples.setdefault("load", []).append(elapsed)
+
+        elapsed, chunks = measure(lambda: chunking_service.chunk_documents(pages))
+        samples.setdefault("chunk", []).append(elapsed)
+
+        texts = [chunk.page_content for chunk in chunks]
+        elapsed, _ = measure(lambda: embedding_service.get_sparse_embeddings(texts))
+        samples.setdefault("embed", []).append(elapsed)
+
+        elapsed, vectors = measure(lambda: embedding_service.prepare_vectors_for_upload(chunks, NAMESPACE))
+        samples.setdefault("prepare_vectors", []).append(elapsed)
+
+        index = SimulatedPineconeIndex(latency=args.index_latency, jitter=0.0, seed=0)
+        vector_store_service = VectorStoreService(settings, embedding_service, index=index)
+        elapsed, _ = measure(lambda: vector_store_service.upload_vectors(iter(vectors), NAMESPACE))
+        samples.setdefault("upload", []).append(elapsed)
+
+    # Query stages, each timed per question
+    fetch_k = max(args.k, min(args.k * settings.RERANK_OVERFETCH, settings.RERANK_MAX_CANDIDATES))
+    for _ in range(args.repeat):
+        for question in QUESTIONS:
+            elapsed, documents = measure(lambda: vector_store_service.similarity_search(question, NAMESPACE, k=args.k))
+            samples.setdefault("search", []).append(elapsed)
+
+            candidates = vector_store_service.similarity_search(question, NAMESPACE, k=fetch_k)
+            elapsed, _ = measure(lambda: embedding_service.search(question, candidates, k=args.k, namespace=NAMESPACE))
+            samples.setdefault("rerank", []).append(elapsed)
+
+            elapsed, _ = measure(lambda: llm_service.pack_context(documents))
+            samples.setdefault("context", []).append(elapsed)
+
+            elapsed, _ = measure(lambda: llm_service.get_structured_answer(question, documents))
+            samples.setdefault("answer", []).append(elapsed)
+
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pdf": Path(args.pdf).name,
+            "pages": len(pages),
+            "chunks": len(chunks),
+            "repeat": args.repeat,
+            "k": args.k,
+            "index_latency": args.index_latency,
+            "settings": {
+                "SPARSE_ENCODER": settings.SPARSE_ENCODER,
+                "TOKENIZER_BACKEND": settings.TOKENIZER_BACKEND,
+                "CHUNK_SIZE": settings.CHUNK_SIZE,
+                "CHUNK_OVERLAP": settings.CHUNK_OVERLAP,
+                "CONTEXT_PACKING_ENABLED": settings.CONTEXT_PACKING_ENABLED,
+                "CONTEXT_TOKEN_BUDGET": settings.CONTEXT_TOKEN_BUDGET,
+            },
+        },
+        "stages": {stage: summarize(stage_samples) for stage, stage_samples in samples.items()},
+    }
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_delta: float) -> List[str]:
+    """Print the change of each stage's median against the baseline and return the regressed stages"""
+    regressions = []
+    print(f"\ncompared with baseline from commit {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')})")
+    for stage, summary in results["stages"].items():
+        before = baseline["stages"].get(stage)
+        if before is None:
+            print(f"{stage:<16} new stage")
+            continue
+        change = summary["median"] / before["median"] - 1 if before["median"] else 0.0
+        regressed = change > threshold and summary["median"] - before["median"] > min_delta
+        if regressed:
+            regressions.append(stage)
+        print(
+            f"{stage:<16} {before['median'] * 1000:10.2f}ms -> {summary['median'] * 1000:10.2f}ms "
+            f"{change * 100:+7.1f}%{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=Settings().PDF_PATH)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--k", type=int, default=30, help="Documents retrieved per question")
+    parser.add_argument("--index-latency", type=float, default=0.0,
+                        help="Simulated Pinecone round-trip in seconds (0 measures local work only)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative increase of a stage's median counted as a regression")
+    parser.add_argument("--min-delta", type=float, default=0.001,
+                        help="Absolute increase in seconds below which a stage never counts as regressed")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(f"\n{results['meta']['pages']} pages, {results['meta']['chunks']} chunks, commit {results['meta']['commit']}")
+    for stage, summary in results["stages"].items():
+        print(
+            f"{stage:<16} median={summary['median'] * 1000:10.2f}ms p95={summary['p95'] * 1000:10.2f}ms "
+            f"samples={summary['samples']}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f"regressed stages: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        _data_dir.cleanup()
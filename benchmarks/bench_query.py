@@ -0,0 +1,131 @@
+"""
+Benchmark sparse query latency of the local in-process index against the
+Pinecone path.
+
+The Pinecone path is the simulated index by default (local scoring plus a
+simulated round-trip); pass --live to query the configured Pinecone index
+instead, which uploads the corpus to a temporary namespace and deletes it after.
+
+Usage (from the repository root):
+    python benchmarks/bench_query.py --vectors 20000 --queries 200 --top-k 70 --latency 0.05
+"""
+from pathlib import Path
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+# The benchmark never talks to OpenAI or Pinecone unless --live is passed, but Settings requires the keys
+for key in ("OPENAI_API_KEY", "PINECONE_API_KEY", "PINECONE_INDEX"):
+    os.environ.setdefault(key, "offline")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from config.settings import Settings  # noqa: E402
+from services.local_sparse_index import LocalSparseIndex  # noqa: E402
+from services.vector_store_service import VectorStoreService, create_index  # noqa: E402
+from pinecone_standin import SimulatedPineconeIndex  # noqa: E402
+
+NAMESPACE = "bench-query"
+
+def zipf_tokens(rng: random.Random, vocabulary: int, count: int):
+    """Token indices drawn with a Zipf-like skew, like words in text"""
+    return {int(vocabulary ** rng.random()) for _ in range(count)}
+
+def make_corpus(count: int, vocabulary: int, seed: int = 0):
+    rng = random.Random(seed)
+    vectors = []
+    for i in range(count):
+        indices = sorted(zipf_tokens(rng, vocabulary, rng.randint(40, 200)))
+        vectors.append({
+            "id": f"{NAMESPACE}#chunk{i + 1}",
+            "sparse_values": {"indices": indices, "values": [rng.uniform(0.2, 2.5) for _ in indices]},
+            "metadata": {"text": f"chunk {i + 1}", "page": i // 3, "page_label": str(i // 3 + 1)}
+        })
+    return vectors
+
+def make_queries(count: int, vocabulary: int, seed: int = 1):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        indices = sorted(zipf_tokens(rng, vocabulary, rng.randint(3, 10)))
+        queries.append({"indices": indices, "values": [rng.uniform(0.5, 8.0) for _ in indices]})
+    return queries
+
+def brute_force(vectors, query, top_k):
+    weights = dict(zip(query["indices"], query["values"]))
+    scored = []
+    for vector in vectors:
+        sparse = vector["sparse_values"]
+        score = sum(weights.get(i, 0.0) * v for i, v in zip(sparse["indices"], sparse["values"]))
+        if score > 0:
+            scored.append((score, vector["id"]))
+    scored.sort(reverse=True)
+    return scored[:top_k]
+
+def time_queries(index, queries, top_k):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.query(vector=None, sparse_vector=query, top_k=top_k, namespace=NAMESPACE, include_metadata=True)
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+def report(name, latencies):
+    print(
+        f"{name:<18} mean={statistics.mean(latencies) * 1000:8.2f}ms "
+        f"p50={latencies[len(latencies) // 2] * 1000:8.2f}ms "
+        f"p95={latencies[int(len(latencies) * 0.95)] * 1000:8.2f}ms "
+        f"queries/sec={len(latencies) / sum(latencies):8.0f}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=70)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated Pinecone round-trip in seconds")
+    parser.add_argument("--live", action="store_true", help="Query the configured Pinecone index instead of the simulated one")
+    args = parser.parse_args()
+
+    vectors = make_corpus(args.vectors, args.vocabulary)
+    queries = make_queries(args.queries, args.vocabulary)
+
+    local = LocalSparseIndex()
+    start = time.perf_counter()
+    local.upsert(vectors, namespace=NAMESPACE)
+    print(f"local index built from {len(vectors)} vectors in {time.perf_counter() - start:.2f}s")
+
+    # Check the inverted index against brute-force scoring
+    for query in queries[:5]:
+        expected = brute_force(vectors, query, args.top_k)
+        matches = local.query(vector=None, sparse_vector=query, top_k=args.top_k, namespace=NAMESPACE).matches
+        # Compare scores rather than IDs, which may be ordered differently on ties
+        assert len(matches) == len(expected) and all(
+            abs(match.score - score) < 1e-3 * max(1.0, score) for match, (score, _) in zip(matches, expected)
+        ), "local index results differ from brute force"
+
+    report("local", time_queries(local, queries, args.top_k))
+
+    settings = Settings().model_copy(update={"VECTOR_STORE_BACKEND": "pinecone"})
+    if args.live:
+        remote = create_index(settings)
+        service = VectorStoreService(settings, embedding_service=None, index=remote)
+        service.upload_vectors(iter(vectors), NAMESPACE)
+        try:
+            # Pinecone is eventually consistent, wait for the namespace to be queryable
+            time.sleep(10)
+            report("pinecone", time_queries(remote, queries, args.top_k))
+        finally:
+            service.delete_namespace(NAMESPACE)
+    else:
+        remote = SimulatedPineconeIndex(latency=args.latency, jitter=args.latency / 5, seed=0)
+        VectorStoreService(settings, embedding_service=None, index=remote).upload_vectors(iter(vectors), NAMESPACE)
+        report("simulated pinecone", time_queries(remote, queries, args.top_k))
+
+if __name__ == "__main__":
+    main()
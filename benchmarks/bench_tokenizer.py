@@ -0,0 +1,86 @@
+"""
+Benchmark the "fast" and "nltk" tokenizer backends of
+EmbeddingService._preprocess_text on the bundled PDF. That both produce the
+same tokens is checked by tests/test_tokenizer.py.
+
+Also times repeated query tokenization with and without the query token cache.
+
+Usage (from the repository root):
+    python benchmarks/bench_tokenizer.py --repeat 3 --queries 10000
+"""
+from pathlib import Path
+import argparse
+import os
+import sys
+import time
+
+# The benchmark never talks to OpenAI or Pinecone, but Settings requires the keys
+for key in ("OPENAI_API_KEY", "PINECONE_API_KEY", "PINECONE_INDEX"):
+    os.environ.setdefault(key, "offline")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from langchain_community.document_loaders import PyPDFLoader  # noqa: E402
+from config.settings import Settings  # noqa: E402
+from services.chunking_service import ChunkingService  # noqa: E402
+from services.embedding_service import EmbeddingService  # noqa: E402
+
+QUESTIONS = [
+    "What is the role of desire in achieving riches?",
+    "How does persistence help overcome failure?",
+    "What is the sixth sense?",
+    "Why is faith important?",
+    "What does the master mind mean?",
+    "How should one use autosuggestion?",
+]
+
+def time_backend(service: EmbeddingService, texts, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            service._preprocess_text(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=Settings().PDF_PATH)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=10000, help="Repeated query strings to tokenize")
+    args = parser.parse_args()
+
+    settings = Settings()
+    pages = PyPDFLoader(args.pdf).load()
+    chunks = ChunkingService(settings).chunk_documents(pages)
+    texts = [doc.page_content for doc in pages] + [doc.page_content for doc in chunks]
+    print(f"{len(pages)} pages and {len(chunks)} chunks from {args.pdf}")
+
+    services = {
+        backend: EmbeddingService(settings.model_copy(update={
+            "TOKENIZER_BACKEND": backend,
+            "QUERY_TOKEN_CACHE_MAX_ENTRIES": 0
+        }))
+        for backend in ("nltk", "fast")
+    }
+    for service in services.values():
+        service.warm_up()
+
+    characters = sum(len(text) for text in texts)
+    timings = {backend: time_backend(service, texts, args.repeat) for backend, service in services.items()}
+    for backend, elapsed in timings.items():
+        print(f"{backend:<6} {elapsed * 1000:8.1f}ms  {characters / elapsed / 1e6:6.2f} MB/s")
+    print(f"speedup {timings['nltk'] / timings['fast']:.1f}x")
+
+    queries = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.queries)]
+    cached = EmbeddingService(settings.model_copy(update={"TOKENIZER_BACKEND": "fast"}))
+    cached.warm_up()
+    for name, service in (("uncached", services["fast"]), ("cached", cached)):
+        start = time.perf_counter()
+        for query in queries:
+            service._preprocess_query(query)
+        elapsed = time.perf_counter() - start
+        print(f"queries {name:<9} {elapsed / len(queries) * 1e6:6.2f}us per query")
+
+if __name__ == "__main__":
+    main()
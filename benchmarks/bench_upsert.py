@@ -0,0 +1,74 @@
+"""
+Benchmark VectorStoreService.upload_vectors against the simulated Pinecone index.
+
+Usage (from the repository root):
+    python benchmarks/bench_upsert.py --vectors 2000 --latency 0.05 --in-flight 1 4 8
+"""
+from pathlib import Path
+import argparse
+import os
+import random
+import string
+import sys
+
+# The benchmark never talks to OpenAI or Pinecone, but Settings requires the keys
+for key in ("OPENAI_API_KEY", "PINECONE_API_KEY", "PINECONE_INDEX"):
+    os.environ.setdefault(key, "offline")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from config.settings import Settings  # noqa: E402
+from services.vector_store_service import VectorStoreService  # noqa: E402
+from pinecone_standin import SimulatedPineconeIndex  # noqa: E402
+
+def make_vectors(count: int, seed: int = 0):
+    """Synthetic chunk vectors with metadata text of varying size"""
+    rng = random.Random(seed)
+    vectors = []
+    for i in range(count):
+        text_length = rng.randint(200, 4000)
+        nnz = rng.randint(20, 150)
+        vectors.append({
+            "id": f"bench#chunk{i + 1}",
+            "sparse_values": {
+                "indices": sorted(rng.sample(range(2 ** 32), nnz)),
+                "values": [rng.random() for _ in range(nnz)]
+            },
+            "metadata": {
+                "text": "".join(rng.choices(string.ascii_lowercase + " ", k=text_length)),
+                "page": i // 3,
+                "page_label": str(i // 3 + 1)
+            }
+        })
+    return vectors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated round-trip in seconds")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--max-batch-bytes", type=int, default=1_500_000)
+    parser.add_argument("--in-flight", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors)
+    for in_flight in args.in_flight:
+        settings = Settings().model_copy(update={
+            "UPSERT_BATCH_SIZE": args.batch_size,
+            "UPSERT_MAX_BATCH_BYTES": args.max_batch_bytes,
+            "UPSERT_MAX_IN_FLIGHT": in_flight
+        })
+        index = SimulatedPineconeIndex(latency=args.latency, jitter=args.latency / 5, seed=0)
+        service = VectorStoreService(settings, embedding_service=None, index=index)
+        report = service.upload_vectors(iter(vectors), "bench")
+        latencies = sorted(report["batch_latencies"])
+        print(
+            f"in_flight={in_flight:<3} batches={report['batches']:<4} "
+            f"seconds={report['seconds']:.2f} vectors/sec={report['vectors_per_second']:.0f} "
+            f"p50={latencies[len(latencies) // 2] * 1000:.0f}ms max={latencies[-1] * 1000:.0f}ms "
+            f"observed_in_flight={index.max_in_flight}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+In-process stand-in for a Pinecone sparse index.
+
+Wraps LocalSparseIndex, which implements the subset of the Pinecone Index API
+used by VectorStoreService, and sleeps on every call to simulate network
+round-trips, so upload and query paths can be exercised and timed without the
+live service.
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from services.local_sparse_index import LocalSparseIndex, Match, QueryResponse  # noqa: E402,F401
+
+# Pinecone's maximum upsert request size
+MAX_REQUEST_BYTES = 2 * 1024 * 1024
+
+class SimulatedPineconeIndex(LocalSparseIndex):
+    def __init__(self, latency: float = 0.05, jitter: float = 0.01, seed: Optional[int] = None):
+        """
+        Args:
+            latency: Mean simulated round-trip time in seconds
+            jitter: Maximum random deviation from the mean latency in seconds
+            seed: Optional seed for the latency jitter
+        """
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+
+    def _round_trip(self) -> None:
+        with self._stats_lock:
+            self._in_flight += 1
+            self.requests += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+        try:
+            time.sleep(delay)
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = "", **kwargs) -> Dict[str, int]:
+        payload_bytes = len(json.dumps({"vectors": vectors, "namespace": namespace}))
+        if payload_bytes > MAX_REQUEST_BYTES:
+            raise ValueError(f"Request size {payload_bytes} exceeds the maximum of {MAX_REQUEST_BYTES} bytes")
+        self._round_trip()
+        return super().upsert(vectors, namespace=namespace, **kwargs)
+
+    def query(self, sparse_vector: Dict[str, List], top_k: int, namespace: str = "",
+              include_metadata: bool = False, vector: Any = None, **kwargs) -> QueryResponse:
+        self._round_trip()
+        return super().query(sparse_vector, top_k, namespace=namespace, include_metadata=include_metadata, vector=vector, **kwargs)
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False, namespace: str = "", **kwargs) -> Dict:
+        self._round_trip()
+        return super().delete(ids=ids, delete_all=delete_all, namespace=namespace, **kwargs)
+
+    def describe_index_stats(self, **kwargs) -> Dict[str, Any]:
+        self._round_trip()
+        return super().describe_index_stats(**kwargs)
+
+class SimulatedAsyncPineconeIndex:
+    """
+    Stand-in for Pinecone's asyncio index client. Queries the records of a
+    SimulatedPineconeIndex after awaiting a simulated round-trip, so many
+    queries can be in flight on one event loop.
+    """
+
+    def __init__(self, index: SimulatedPineconeIndex):
+        self.index = index
+
+    async def query(self, sparse_vector: Dict[str, List], top_k: int, namespace: str = "",
+                    include_metadata: bool = False, vector: Any = None, **kwargs) -> QueryResponse:
+        await asyncio.sleep(max(0.0, self.index.latency + self.index._random.uniform(-self.index.jitter, self.index.jitter)))
+        return LocalSparseIndex.query(self.index, sparse_vector, top_k, namespace=namespace,
+                                      include_metadata=include_metadata, vector=vector, **kwargs)
+
+    async def close(self) -> None:
+        pass
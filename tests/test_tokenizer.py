@@ -0,0 +1,82 @@
+"""
+Check that the "fast" tokenizer backend produces the same tokens as the
+"nltk" backend (word_tokenize) for every page and chunk of the bundled PDF,
+and for inputs that exercise contractions and unusual characters.
+
+Usage (from the repository root):
+    python -m pytest tests/test_tokenizer.py
+"""
+from pathlib import Path
+import os
+import sys
+
+import pytest
+
+# The test never talks to OpenAI or Pinecone, but Settings requires the keys
+for key in ("OPENAI_API_KEY", "PINECONE_API_KEY", "PINECONE_INDEX"):
+    os.environ.setdefault(key, "offline")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from config.settings import Settings  # noqa: E402
+from services.chunking_service import ChunkingService  # noqa: E402
+from services.embedding_service import EmbeddingService  # noqa: E402
+
+QUESTIONS = [
+    "What is the role of desire in achieving riches?",
+    "How does persistence help overcome failure?",
+    "What is the sixth sense?",
+    "Why is faith important?",
+    "What does the master mind mean?",
+    "How should one use autosuggestion?",
+]
+
+# Inputs that exercise the contractions word_tokenize splits and unusual characters
+EDGE_CASES = [
+    "I cannot, I wanna, you gotta -- lemme gimme gonna",
+    "CANNOT Wanna 2cannot cannot2 wanna.",
+    "Don't stop; it's the 'end' of \"quoted\" text...",
+    "Ünïcödé naïve café KELVIN K and İstanbul",
+    "tabs\tand\nnewlines and wide spaces",
+    "",
+]
+
+@pytest.fixture(scope="module")
+def services():
+    settings = Settings()
+    services = {
+        backend: EmbeddingService(settings.model_copy(update={
+            "TOKENIZER_BACKEND": backend,
+            "QUERY_TOKEN_CACHE_MAX_ENTRIES": 0
+        }))
+        for backend in ("nltk", "fast")
+    }
+    for service in services.values():
+        service.warm_up()
+    return services
+
+@pytest.fixture(scope="module")
+def pdf_texts():
+    from langchain_community.document_loaders import PyPDFLoader
+
+    settings = Settings()
+    pages = PyPDFLoader(settings.PDF_PATH).load()
+    chunks = ChunkingService(settings).chunk_documents(pages)
+    return [doc.page_content for doc in pages] + [doc.page_content for doc in chunks]
+
+def assert_same_tokens(services, texts):
+    for text in texts:
+        expected = services["nltk"]._preprocess_text(text)
+        actual = services["fast"]._preprocess_text(text)
+        assert actual == expected, f"fast tokens differ from nltk for {text[:80]!r}"
+
+def test_bundled_pdf_tokens_match_nltk(services, pdf_texts):
+    assert pdf_texts
+    assert_same_tokens(services, pdf_texts)
+
+def test_edge_case_tokens_match_nltk(services):
+    assert_same_tokens(services, EDGE_CASES + QUESTIONS)
+
+def test_query_tokens_match_nltk(services):
+    for query in QUESTIONS:
+        assert services["fast"]._preprocess_query(query) == services["nltk"]._preprocess_query(query)